@@ -0,0 +1,42 @@
+"""
+Scaling benchmark for detect_functions_from_code.
+
+Run from the service directory:
+    python benchmarks/bench_detect_functions.py
+
+Each size is a module from corpora.generate_python made of many small functions and classes.
+With the SourceIndex the time per line should stay roughly flat as the file grows.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from corpora import generate_python  # noqa: E402
+from utils import detect_functions_from_code  # noqa: E402
+
+SIZES = (1000, 2500, 5000, 10000, 20000)
+REPEATS = 3
+# Lines per generated function, so the definition count grows with the module
+FUNCTION_LINES = 5
+
+def best_time(code):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        detect_functions_from_code(code)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    print(f"{'lines':>8} {'functions':>10} {'seconds':>10} {'us/line':>10}")
+    for size in SIZES:
+        code = generate_python(size, functions=size // FUNCTION_LINES)
+        num_lines = code.count("\n")
+        num_functions = len(detect_functions_from_code(code)["functions"])
+        elapsed = best_time(code)
+        print(f"{num_lines:>8} {num_functions:>10} {elapsed:>10.4f} {elapsed / num_lines * 1e6:>10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Deterministic synthetic inputs for the benchmarks.
+
+Every generator is a pure function of its arguments, so results from different
+runs and machines are comparable.
+"""
+import random
+
+def _python_function(name, rng, nesting, body_lines, indent="", method=False):
+    """
+    Lines of one function with control flow nested up to nesting levels.
+    """
+    args = "self, a, b" if method else "a, b"
+    lines = [f"{indent}def {name}({args}):", f"{indent}    total = a + b"]
+    depth = 0
+    while len(lines) < body_lines:
+        pad = indent + "    " * (depth + 1)
+        choice = rng.random()
+        if depth < nesting and choice < 0.3:
+            kind = rng.choice(("if", "for", "while"))
+            if kind == "if":
+                lines.append(f"{pad}if total > {rng.randint(0, 99)}:")
+            elif kind == "for":
+                lines.append(f"{pad}for i in range({rng.randint(1, 9)}):")
+            else:
+                lines.append(f"{pad}while total < {rng.randint(100, 999)}:")
+            depth += 1
+            lines.append(f"{indent}{'    ' * (depth + 1)}total += {rng.randint(1, 9)}")
+        elif depth > 0 and choice < 0.45:
+            depth -= 1
+        elif choice < 0.6:
+            lines.append(f"{pad}print(total)")
+        elif choice < 0.7:
+            lines.append(f"{pad}# step {len(lines)}")
+        else:
+            lines.append(f"{pad}total = total * {rng.randint(2, 5)} - b")
+    lines.append(f"{indent}    return total")
+    return lines
+
+def generate_python(num_lines, nesting=3, functions=None, seed=0):
+    """
+    Build a valid Python module of about num_lines lines.
+
+    Args:
+    - num_lines (int): Target size.
+    - nesting (int): Maximum depth of if/for/while blocks inside functions.
+    - functions (int, optional): Number of functions; by default one per ~20 lines.
+      Every fifth definition is a class with one method.
+    - seed (int): Seed of the pseudo-random statement mix.
+    """
+    rng = random.Random(seed)
+    functions = functions or max(num_lines // 20, 1)
+    body_lines = max(num_lines // functions - 2, 3)
+    lines = ["import os", "import sys", ""]
+    for i in range(functions):
+        if i % 5 == 4:
+            lines.append(f"class Generated{i}:")
+            lines.extend(_python_function(f"method_{i}", rng, nesting, body_lines, "    ", method=True))
+        else:
+            lines.extend(_python_function(f"function_{i}", rng, nesting, body_lines))
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+def break_python(code, every=50, seed=0):
+    """
+    Insert a line with a syntax error about every `every` functions, for the tolerant parser.
+    """
+    rng = random.Random(seed)
+    out = []
+    definitions = 0
+    for line in code.split("\n"):
+        out.append(line)
+        if line.startswith("def "):
+            definitions += 1
+            if definitions % every == 1:
+                out.append(rng.choice(("    x = = 1", "    if (:", "    return ]")))
+    return "\n".join(out)
+
+def generate_pseudocode(num_lines, nesting=3, seed=0):
+    """
+    Build IGCSE pseudocode of about num_lines lines using INPUT/OUTPUT, assignments,
+    IF/ELSE/ENDIF, WHILE/ENDWHILE and FOR/NEXT, with blocks nested up to nesting levels.
+    """
+    rng = random.Random(seed)
+    lines = []
+    open_blocks = []
+    while len(lines) < num_lines or open_blocks:
+        choice = rng.random()
+        closing = len(lines) >= num_lines
+        if not closing and len(open_blocks) < nesting and choice < 0.25:
+            kind = rng.choice(("IF", "WHILE", "FOR"))
+            if kind == "IF":
+                lines.append(f"IF x > {rng.randint(0, 99)} THEN")
+                open_blocks.append(["IF", False])
+            elif kind == "WHILE":
+                lines.append(f"WHILE x < {rng.randint(100, 999)} DO")
+                open_blocks.append(["WHILE", False])
+            else:
+                lines.append(f"FOR i <- 1 TO {rng.randint(2, 9)}")
+                open_blocks.append(["FOR", False])
+            lines.append(f"x <- x + {rng.randint(1, 9)}")
+        elif open_blocks and (closing or choice < 0.4):
+            kind, has_else = open_blocks[-1]
+            if kind == "IF" and not has_else and rng.random() < 0.5:
+                open_blocks[-1][1] = True
+                lines.append("ELSE")
+                lines.append(f"x <- x - {rng.randint(1, 9)}")
+                continue
+            open_blocks.pop()
+            lines.append({"IF": "ENDIF", "WHILE": "ENDWHILE", "FOR": "NEXT i"}[kind])
+        elif choice < 0.55:
+            lines.append("INPUT x")
+        elif choice < 0.7:
+            lines.append("OUTPUT x")
+        else:
+            lines.append(f"x <- x * {rng.randint(2, 5)}")
+    return "\n".join(lines) + "\n"
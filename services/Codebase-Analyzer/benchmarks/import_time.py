@@ -0,0 +1,91 @@
+"""
+Cold-start measurement for the Codebase-Analyzer.
+
+Run from the service directory:
+    python benchmarks/import_time.py --output benchmarks/import_time.json
+
+Every measurement runs in a fresh interpreter:
+- the wall time of `import app`, i.e. how long until the service can take traffic,
+- the modules app imports directly, by cumulative import time (python -X importtime),
+- the time warmup.warm_up() spends loading the lazily imported backends, which the first
+  request using each backend pays instead when PRELOAD_BACKENDS is not set.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+REPEATS = 5
+
+IMPORT_APP = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+WARM_UP = "import json, app, warmup; print(json.dumps(warmup.warm_up()))"
+
+def run_python(args, code):
+    # Workers are never started by an import, but keep any accidental job inline and the store off
+    env = dict(os.environ, SANDBOX_WORKERS="0", RESULT_STORE_PATH="")
+    return subprocess.run([sys.executable, *args, "-c", code], cwd=SRC, env=env,
+                          capture_output=True, text=True, check=True)
+
+def import_seconds(repeats):
+    return [float(run_python([], IMPORT_APP).stdout.strip().splitlines()[-1]) for _ in range(repeats)]
+
+def import_breakdown():
+    """
+    Cumulative import time (seconds) of every module app imports directly.
+    """
+    stderr = run_python(["-X", "importtime"], "import app").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        # Direct imports of app are indented one level deeper than app itself
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((depth, name.strip(), int(cumulative) / 1e6))
+
+    app_depth = next(depth for depth, name, _ in rows if name == "app")
+    return sorted(((name, seconds) for depth, name, seconds in rows if depth == app_depth + 1),
+                  key=lambda row: row[1], reverse=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--top", type=int, default=15, help="Modules to list in the breakdown")
+    parser.add_argument("--output", default="", help="Write JSON results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    seconds = import_seconds(args.repeats)
+    print(f"import app: median {statistics.median(seconds):.3f}s, min {min(seconds):.3f}s over {len(seconds)} runs")
+
+    breakdown = import_breakdown()
+    print()
+    print(f"{'module':<30} {'seconds':>10}")
+    for name, module_seconds in breakdown[:args.top]:
+        print(f"{name:<30} {module_seconds:>10.3f}")
+
+    warm_up = json.loads(run_python([], WARM_UP).stdout.strip().splitlines()[-1])
+    print()
+    print(f"{'lazy backend':<30} {'seconds':>10}")
+    for name, module_seconds in warm_up.items():
+        print(f"{name:<30} {'missing' if module_seconds is None else f'{module_seconds:.3f}':>10}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "python": sys.version.split()[0],
+                "import_app_seconds": seconds,
+                "breakdown": [{"module": name, "seconds": module_seconds} for name, module_seconds in breakdown],
+                "warm_up_seconds": warm_up,
+            }, output, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Scaling benchmark suite for the Codebase-Analyzer.
+
+Run from the service directory:
+    python benchmarks/run_benchmarks.py --output benchmarks/results.json
+
+Every target is timed on deterministic synthetic inputs (see corpora.py) at each size.
+Results are written as JSON together with the fitted scaling exponent of every target
+(time ~ lines ** exponent). An exponent well above 1 means the target scales
+super-linearly; --max-exponent makes the run fail when that happens.
+
+The heavy targets (analyze_code, the tiled PNG drawer) only run at HEAVY_CAP lines by
+default; --large runs them at every size.
+"""
+import argparse
+import ast
+import json
+import math
+import os
+import platform
+import sys
+import time
+import warnings
+
+# Time the functions themselves, not the hand-off to the sandbox pool or reads from the result store
+os.environ.setdefault("SANDBOX_WORKERS", "0")
+os.environ.setdefault("RESULT_STORE_PATH", "")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from corpora import break_python, generate_pseudocode, generate_python  # noqa: E402
+from utils import (detect_functions_from_code, filter_and_retry, flowchart_cache,  # noqa: E402
+                   flowchart_from_snippet, generate_flowchart_from_code)
+import Converter  # noqa: E402
+from surfaces import SvgSurface, TiledPngSurface  # noqa: E402
+
+try:
+    from analyzer import analyze_code
+except ImportError:  # python-code-analyzer is optional for the benchmarks
+    analyze_code = None
+
+SIZES = (1000, 10000, 100000)
+REPEATS = 3
+# Default line cap of the heavy targets
+HEAVY_CAP = 1000
+# A run slower than this is not repeated
+REPEAT_LIMIT_SECONDS = 10
+
+class NullStream:
+    """
+    Write-only sink, so rendering benchmarks measure drawing rather than disk I/O.
+    """
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+def first_syntax_error(code):
+    try:
+        ast.parse(code)
+    except SyntaxError as se:
+        return se.lineno
+    return None
+
+def middle_function(code):
+    names = [line[4:line.index("(")] for line in code.split("\n") if line.startswith("def ")]
+    return names[len(names) // 2]
+
+def setup_detect_functions(corpus):
+    return lambda: detect_functions_from_code(corpus)
+
+def setup_filter_and_retry(corpus):
+    error_line = first_syntax_error(corpus)
+    return lambda: filter_and_retry(corpus, error_line, {}, [], [])
+
+def setup_generate_flowchart(corpus):
+    return lambda: generate_flowchart_from_code(corpus, 'python')
+
+def setup_generate_flowchart_layered(corpus):
+    return lambda: generate_flowchart_from_code(corpus, 'python', layout='layered')
+
+def setup_flowchart_from_snippet(corpus):
+    function_name = middle_function(corpus)
+
+    def run():
+        flowchart_cache.clear()
+        return flowchart_from_snippet(corpus, function_name)
+    return run
+
+def setup_analyze_code(corpus):
+    return lambda: analyze_code(corpus)
+
+def setup_translation(corpus):
+    font_data = {"path": Converter.BUNDLED_FONT, "size": 20}
+    return lambda: Converter.translation(Converter.preprocess(corpus.splitlines()), font_data)
+
+def setup_drawer(corpus):
+    font_data = {"path": Converter.BUNDLED_FONT, "size": 20}
+    chart = Converter.translation(Converter.preprocess(corpus.splitlines()), font_data)
+    # The tiled surface keeps memory bounded at every size
+    return lambda: Converter.drawer(*chart, font_data, TiledPngSurface(NullStream()))
+
+def setup_drawer_svg(corpus):
+    font_data = {"path": Converter.BUNDLED_FONT, "size": 20}
+    chart = Converter.translation(Converter.preprocess(corpus.splitlines()), font_data)
+    return lambda: Converter.drawer(*chart, font_data, SvgSurface(NullStream()))
+
+# (name, corpus, setup, default line cap or None)
+TARGETS = (
+    ("detect_functions_from_code", "python", setup_detect_functions, None),
+    ("filter_and_retry", "broken", setup_filter_and_retry, None),
+    ("generate_flowchart_from_code", "python", setup_generate_flowchart, None),
+    ("generate_flowchart_from_code[layered]", "python", setup_generate_flowchart_layered, None),
+    ("flowchart_from_snippet", "python", setup_flowchart_from_snippet, None),
+    ("analyze_code", "python", setup_analyze_code, HEAVY_CAP),
+    ("Converter.translation", "pseudocode", setup_translation, None),
+    ("Converter.drawer[png-tiled]", "pseudocode", setup_drawer, HEAVY_CAP),
+    ("Converter.drawer[svg]", "pseudocode", setup_drawer_svg, None),
+)
+
+def best_time(run, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        if elapsed > REPEAT_LIMIT_SECONDS:
+            break
+    return best
+
+def scaling_exponent(points):
+    """
+    Least-squares slope of log(seconds) over log(lines).
+    """
+    points = [(math.log(lines), math.log(seconds)) for lines, seconds in points if seconds > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return round(sum((x - mean_x) * (y - mean_y) for x, y in points) / variance, 3)
+
+def build_corpus(kind, size, args):
+    if kind == "pseudocode":
+        return generate_pseudocode(size, nesting=args.nesting, seed=args.seed)
+    code = generate_python(size, nesting=args.nesting, functions=args.functions, seed=args.seed)
+    if kind == "broken":
+        code = break_python(code, seed=args.seed)
+    return code
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="Comma separated line counts")
+    parser.add_argument("--nesting", type=int, default=3, help="Maximum block nesting depth")
+    parser.add_argument("--functions", type=int, default=None, help="Functions per Python module (default: lines / 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--only", default="", help="Comma separated target names to run")
+    parser.add_argument("--large", action="store_true", help="Run the heavy targets at every size, not only up to their cap")
+    parser.add_argument("--output", default="", help="Write JSON results to this file")
+    parser.add_argument("--max-exponent", type=float, default=None,
+                        help="Exit with status 1 when a target's scaling exponent exceeds this value")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    only = {name for name in args.only.split(",") if name}
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    corpora = {}
+    results = []
+    print(f"{'target':<40} {'lines':>8} {'seconds':>10} {'us/line':>10}")
+    for name, kind, setup, cap in TARGETS:
+        if only and name not in only:
+            continue
+        target = {"target": name, "corpus": kind, "runs": [], "skipped": []}
+        results.append(target)
+        if name == "analyze_code" and analyze_code is None:
+            target["skipped"].append({"reason": "python-code-analyzer is not installed"})
+            print(f"{name:<40} {'skipped: python-code-analyzer is not installed':>30}")
+            continue
+
+        for size in sizes:
+            if cap is not None and size > cap and not args.large:
+                target["skipped"].append({"lines": size, "reason": f"capped at {cap} lines (use --large)"})
+                continue
+            if (kind, size) not in corpora:
+                corpora[(kind, size)] = build_corpus(kind, size, args)
+            corpus = corpora[(kind, size)]
+            num_lines = corpus.count("\n")
+            try:
+                elapsed = best_time(setup(corpus), args.repeats)
+            except Exception as e:
+                target["skipped"].append({"lines": num_lines, "reason": f"{type(e).__name__}: {str(e)}"})
+                print(f"{name:<40} {num_lines:>8} failed: {type(e).__name__}: {str(e)}")
+                continue
+            target["runs"].append({"lines": num_lines, "seconds": round(elapsed, 6),
+                                   "us_per_line": round(elapsed / num_lines * 1e6, 3)})
+            print(f"{name:<40} {num_lines:>8} {elapsed:>10.4f} {elapsed / num_lines * 1e6:>10.2f}")
+
+        target["scaling_exponent"] = scaling_exponent([(run["lines"], run["seconds"]) for run in target["runs"]])
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "nesting": args.nesting,
+            "functions": args.functions,
+            "seed": args.seed,
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    print()
+    failed = []
+    for target in results:
+        exponent = target.get("scaling_exponent")
+        if exponent is not None:
+            print(f"{target['target']:<40} scaling exponent {exponent:.2f}")
+            if args.max_exponent is not None and exponent > args.max_exponent:
+                failed.append(target["target"])
+    if failed:
+        print(f"Super-linear scaling (exponent > {args.max_exponent}): {', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
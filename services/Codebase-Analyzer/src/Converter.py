@@ -5,77 +5,128 @@ converts pseudocode -> .png flowcharts
 pusedocode type is igcse
 '''
 
+import io
 import re
 import os
+from collections import namedtuple
+from functools import lru_cache
 from math import log, floor
 
 import click
 from PIL import Image, ImageDraw, ImageFont
 
-from tree import newTree,newNode
-
-def read(file_name):
-
-    #get raw lines out of txt
-    
-    converter = os.path.realpath(__file__)
-    self_path = re.compile(r'(.+)Converter.py')
-    text_path = re.search(self_path,converter).group(1) + file_name
-    text_file = open(text_path,"r")
-    lines = text_file.readlines()
-    text_file.close()
-    
-    # Basic Preprocessor
-    
-    processed_lines = []
+from tree import inOrder
+from surfaces import RasterSurface, SvgSurface, TiledPngSurface
+
+# Font and text-metrics caches shared by translation and drawer
+
+# Font shipped next to this file, used when the requested font file does not exist
+BUNDLED_FONT = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'NotoSans-Regular.ttf')
+
+def resolve_font_path(font_path):
+    if font_path and os.path.isfile(font_path):
+        return font_path
+    return BUNDLED_FONT
+
+@lru_cache(maxsize=None)
+def get_font(font_path,font_size):
+    # Fonts are loaded once per (path, size) for the whole process
+    return ImageFont.truetype(resolve_font_path(font_path), font_size)
+
+@lru_cache(maxsize=None)
+def measuring_draw():
+    # 1x1 canvas used only for text measurement, created on the first measurement
+    return ImageDraw.Draw(Image.new('RGB', (1, 1), color = 'white'))
+
+@lru_cache(maxsize=65536)
+def text_size(font,text):
+    # (width, height) of text, measured once per (font, text)
+    return measuring_draw().textsize(text,font=font)
+
+# One combined pattern classifies a stripped line in a single match.
+# FOR/NEXT are expanded into WHILE loops by the tokenizer.
+TOKEN_RE = re.compile(
+    r'^(?:'
+    r'(?P<terminator>START|STOP)$'
+    r'|(?P<io>(?:INPUT|OUTPUT)\s.+)'
+    r'|IF\s(?P<if>.+)\sTHEN$'
+    r'|(?P<else>ELSE)$'
+    r'|(?P<endif>ENDIF)$'
+    r'|WHILE\s(?P<while>.+)\sDO$'
+    r'|(?P<endwhile>ENDWHILE)$'
+    r'|FOR\s(?P<for_var>.+)\s<-\s(?P<for_low>.+)\sTO\s(?P<for_high>.+)'
+    r'|NEXT\s(?P<next_var>.+)'
+    r')'
+)
+
+# Typed IR produced by the tokenizer: kind is START, STOP, IO, IF, ELSE, ENDIF, WHILE, ENDWHILE or PROCESS,
+# content is what goes in the block and line is the full statement (used to size decisions)
+Token = namedtuple('Token', ['kind', 'content', 'line'])
+
+def classify(line,match=None):
+    if match is None:
+        match = TOKEN_RE.match(line)
+    group = match.lastgroup if match is not None else None
+    if group == 'io':
+        return Token('IO', line, line)
+    if group == 'if':
+        return Token('IF', match.group('if'), line)
+    if group == 'while':
+        return Token('WHILE', match.group('while'), line)
+    if group in ('terminator', 'else', 'endif', 'endwhile'):
+        return Token(line, line, line)
+    return Token('PROCESS', line, line)
+
+def preprocess(lines):
     
-    for_re = re.compile(r'^FOR\s(.+)\s<-\s(.+)\sTO\s(.+)')
-    next_re = re.compile(r'^NEXT\s(.+)')
+    # Basic Preprocessor: a lazy, single pass over the raw lines yielding Tokens
     
-    processed_lines.append("START")
+    yield Token('START', 'START', 'START')
     
     for line in lines:
         
-        line = line.rstrip().lstrip()
+        line = line.strip()
+        if line == '':
+            continue
 
-        if re.search(for_re,line):
-            var = re.search(for_re,line).group(1)
-            low = re.search(for_re,line).group(2)
-            high = re.search(for_re,line).group(3)
+        match = TOKEN_RE.match(line)
+        group = match.lastgroup if match is not None else None
 
-            processed_lines.append(var + " = " + low)
-            processed_lines.append("WHILE " + var + " < " + high + " DO")
+        if group == 'for_high':
+            var, low, high = match.group('for_var', 'for_low', 'for_high')
+            yield classify(var + " = " + low)
+            yield classify("WHILE " + var + " < " + high + " DO")
 
-        elif re.search(next_re,line):
-            var = re.search(next_re,line).group(1)
-
-            processed_lines.append(var + " = " + var + " + 1")
-            processed_lines.append("ENDWHILE")
-        
-        elif line == '':
-            pass
+        elif group == 'next_var':
+            var = match.group('next_var')
+            yield classify(var + " = " + var + " + 1")
+            yield Token('ENDWHILE', 'ENDWHILE', 'ENDWHILE')
 
         else:
-            processed_lines.append(line)
-
-    processed_lines.append("STOP")
-    
-    return processed_lines
+            yield classify(line, match)
 
-def translation(lines,font_data):
+    yield Token('STOP', 'STOP', 'STOP')
 
+def read(source):
     
-    # All the different fundamental types of statements
+    # Streams the tokens of a pseudocode file (path) or of any iterable of lines.
+    # Relative paths that do not exist from the working directory are looked up next to this file.
     
-    input_re = re.compile(r'^INPUT\s(.+)')
-    output_re = re.compile(r'^OUTPUT\s(.+)')
-
-    if_re = re.compile(r'^IF\s(.+)\sTHEN$')
-    else_re = re.compile(r'^ELSE$')
-    endif_re = re.compile(r'^ENDIF$')
+    if not isinstance(source, (str, os.PathLike)):
+        return preprocess(source)
+    
+    if not os.path.isfile(source):
+        source = os.path.join(os.path.dirname(os.path.realpath(__file__)), source)
     
-    while_re = re.compile(r'^WHILE\s(.+)\sDO$')
-    endwhile_re = re.compile(r'^ENDWHILE$')
+    def stream():
+        with open(source, "r") as text_file:
+            yield from preprocess(text_file)
+    
+    return stream()
+
+def translation(lines,font_data):
+
+    # lines is an iterable of Tokens (see preprocess), consumed in one pass
 
     chart_code = []
 
@@ -85,24 +136,10 @@ def translation(lines,font_data):
     branch_width = {} #keeps track of the maximum width of each branch
     layer_height = {} #keeps track of the maximum height of each layer
 
-    # Get the current working directory
-    base_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Create an absolute path to the font file
-    font_path = os.path.join(base_dir, 'NotoSans-Regular.ttf')
-
-    # Then pass this font_path to your font loading code
-    font_data = {"path": font_path, "size": 20}
-
-
-    
-    
+    # A missing font file falls back to the bundled NotoSans (see get_font)
     font_path = font_data['path']
     font_size = font_data['size']
-    font = ImageFont.truetype(font_path, font_size)
-
-    img = Image.new('RGB', (10, 10), color = 'white')
-    draw = ImageDraw.Draw(img)
+    font = get_font(font_path, font_size)
     
     x = [1] # stack used to navigate the pseudocode as a binary tree
     y = [1] # stack used to navigate the layers
@@ -125,8 +162,9 @@ def translation(lines,font_data):
     
     # Then the block is added to the chart code with its relevant attributes
     
-    for i in range(0,len(lines)):
-        line = lines[i]
+    for token in lines:
+        line = token.line
+        kind = token.kind
         
         if x[-1] not in amount_per_branch:
             amount_per_branch[x[-1]] = 0
@@ -134,42 +172,42 @@ def translation(lines,font_data):
             branch_width[x[-1]] = 0
 
         if y[-1] not in layer_height:
-            layer_height[y[-1]] = draw.textsize("a",font=font)[1] + font_size 
+            layer_height[y[-1]] = text_size(font,"a")[1] + font_size 
 
-        if line == "START" or line == "STOP":
+        if kind == "START" or kind == "STOP":
             
             if line == "STOP":
                 chart_code.append({"type":"Terminator","content":line,"position":[x[-1],y[-1]],"role":'t'})
             else:
                 chart_code.append({"type":"Terminator","content":line,"position":[x[-1],y[-1]],"role":'n'})
                 
-            if draw.textsize(line,font=font)[0] + font_size * 2 > branch_width[x[-1]]:
-                branch_width[x[-1]] = draw.textsize(line,font=font)[0] + font_size * 2
+            if text_size(font,line)[0] + font_size * 2 > branch_width[x[-1]]:
+                branch_width[x[-1]] = text_size(font,line)[0] + font_size * 2
 
-            if draw.textsize(line,font=font)[1] + font_size + 2*font_size > layer_height[y[-1]]:
-                layer_height[y[-1]] = draw.textsize(line,font=font)[1] + 2*font_size
+            if text_size(font,line)[1] + font_size + 2*font_size > layer_height[y[-1]]:
+                layer_height[y[-1]] = text_size(font,line)[1] + 2*font_size
                 
             amount_per_branch[x[-1]] += 1
             y[-1] +=1
         
-        elif re.search(input_re,line) or re.search(output_re,line):
+        elif kind == "IO":
             chart_code.append({"type":"IO","content":line,"position":[x[-1],y[-1]],"role":'n'})
 
-            if draw.textsize(line,font=font)[0] + font_size * 2 > branch_width[x[-1]]:
-                branch_width[x[-1]] = draw.textsize(line,font=font)[0] + font_size * 2
+            if text_size(font,line)[0] + font_size * 2 > branch_width[x[-1]]:
+                branch_width[x[-1]] = text_size(font,line)[0] + font_size * 2
 
-            if draw.textsize(line,font=font)[1] + font_size > layer_height[y[-1]]:
-                layer_height[y[-1]] = draw.textsize(line,font=font)[1] + font_size
+            if text_size(font,line)[1] + font_size > layer_height[y[-1]]:
+                layer_height[y[-1]] = text_size(font,line)[1] + font_size
                 
             amount_per_branch[x[-1]] += 1
             y[-1] +=1
 
-        elif re.search(if_re,line):
-            chart_code.append({"type":"Decision","content":re.search(if_re,line).group(1),"position":[x[-1],y[-1]],"role":'o'})
+        elif kind == "IF":
+            chart_code.append({"type":"Decision","content":token.content,"position":[x[-1],y[-1]],"role":'o'})
 
             if len(line) > len("IF")+1:    
-                width = 3/2*draw.textsize(line,font=font)[0]
-                height = 5*draw.textsize(line,font=font)[1] 
+                width = 3/2*text_size(font,line)[0]
+                height = 5*text_size(font,line)[1] 
             else:
                 width = 5*font_size
                 height = 5*font_size 
@@ -187,7 +225,7 @@ def translation(lines,font_data):
             x.append(2*x[-1])
             y.append(y[-1]+1)
 
-        elif re.search(else_re,line):
+        elif kind == "ELSE":
             if x[-1] % 2 == 0:
                 x[-1] += 1
                 y[-1] = y[-2] + 1
@@ -195,7 +233,7 @@ def translation(lines,font_data):
                 x = x[:-1]
                 y = y[:-1]
 
-        elif re.search(endif_re,line):
+        elif kind == "ENDIF":
             
             if x[-1] % 2 == 0:
                 x[-1] += 1
@@ -207,7 +245,7 @@ def translation(lines,font_data):
                     branch_width[x[-1]] = 0
 
                 if y[-1] not in layer_height:
-                    layer_height[y[-1]] = draw.textsize("a",font=font)[1] + font_size
+                    layer_height[y[-1]] = text_size(font,"a")[1] + font_size
 
                 chart_code.append({"type":"Connector","content":"c","position":[x[-1],y[-1]],"role":'e'})
 
@@ -232,12 +270,12 @@ def translation(lines,font_data):
             amount_per_branch[x[-1]] += 1
             y[-1] += 1
             
-        elif re.search(while_re,line):
-            chart_code.append({"type":"Decision","content":re.search(while_re,line).group(1),"position":[x[-1],y[-1]],"role":'o'})
+        elif kind == "WHILE":
+            chart_code.append({"type":"Decision","content":token.content,"position":[x[-1],y[-1]],"role":'o'})
             
             if len(line) > len("IF")+1:    
-                width = 3/2*draw.textsize(line,font=font)[0]
-                height = 5*draw.textsize(line,font=font)[1] 
+                width = 3/2*text_size(font,line)[0]
+                height = 5*text_size(font,line)[1] 
             else:
                 width = 5*font_size
                 height = 5*font_size
@@ -255,7 +293,7 @@ def translation(lines,font_data):
             x.append(2*x[-1])
             y.append(y[-1]+1)
         
-        elif re.search(endwhile_re,line):
+        elif kind == "ENDWHILE":
             
             x[-1] += 1
             y[-1] = y[-2] + 1
@@ -266,7 +304,7 @@ def translation(lines,font_data):
                 branch_width[x[-1]] = 0
 
             if y[-1] not in layer_height:
-                layer_height[y[-1]] = draw.textsize("a",font=font)[1] + font_size
+                layer_height[y[-1]] = text_size(font,"a")[1] + font_size
             
             chart_code.append({"type":"Connector","content":"c","position":[x[-1],y[-1]],"role":'e'})
                 
@@ -293,29 +331,28 @@ def translation(lines,font_data):
         else:   
             chart_code.append({"type":"Process","content":line,"position":[x[-1],y[-1]],"role":'n'})
 
-            if draw.textsize(line,font=font)[0] + font_size * 2 > branch_width[x[-1]]:
-                branch_width[x[-1]] = draw.textsize(line,font=font)[0] + font_size * 2
+            if text_size(font,line)[0] + font_size * 2 > branch_width[x[-1]]:
+                branch_width[x[-1]] = text_size(font,line)[0] + font_size * 2
 
-            if draw.textsize(line,font=font)[1] + font_size > layer_height[y[-1]]:
-                layer_height[y[-1]] = draw.textsize(line,font=font)[1] + font_size
+            if text_size(font,line)[1] + font_size > layer_height[y[-1]]:
+                layer_height[y[-1]] = text_size(font,line)[1] + font_size
                 
             amount_per_branch[x[-1]] += 1
             y[-1] +=1
 
-    del draw,img
-    
     max_branch = 2 ** (floor(log(max(amount_per_branch),2))+1) - 1 #biggest branch
     
     max_y = amount_per_branch[1] #the last layer in the flowchart
     
     return chart_code,max_branch,max_y,layer_height,branch_width
 
-def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
+def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data,surface=None):
+    # max_branch is unused and only kept so translation's tuple can still be passed as is
     
     def Terminator(text,position):
         
-        width = draw.textsize(text,font=font)[0] + font_size * 2
-        height = draw.textsize(text,font=font)[1] + font_size * 2
+        width = text_size(font,text)[0] + font_size * 2
+        height = text_size(font,text)[1] + font_size * 2
         
         x = width_offset + combined_widths[position[0]] + branch_width[position[0]]/2 - width/2
         y = combined_heights[position[1]]
@@ -337,14 +374,14 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
             draw.line([(coords[0]+width,coords[1]+height/2),(coords[0]+width/2,coords[1]+height)],fill='black', width=1)
 
         if len(text) > len("IF")+1:    
-            width = 3/2*draw.textsize(text,font=font)[0]
-            height = 5*draw.textsize(text,font=font)[1] 
-            text_offset = draw.textsize(text,font=font)[0]/4
+            width = 3/2*text_size(font,text)[0]
+            height = 5*text_size(font,text)[1] 
+            text_offset = text_size(font,text)[0]/4
             
         else:
             width = 5*font_size
             height = 5*font_size
-            text_offset = (width - draw.textsize(text,font=font)[0])/2
+            text_offset = (width - text_size(font,text)[0])/2
 
         x = width_offset + combined_widths[position[0]] + branch_width[position[0]]/2 - width/2
         y = combined_heights[position[1]]
@@ -358,8 +395,8 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
 
     def Process(text,position):
         
-        width = draw.textsize(text,font=font)[0] + font_size * 2
-        height = draw.textsize(text,font=font)[1] + font_size
+        width = text_size(font,text)[0] + font_size * 2
+        height = text_size(font,text)[1] + font_size
 
         x = width_offset + combined_widths[position[0]] + branch_width[position[0]]/2 - width/2 
         y = combined_heights[position[1]]
@@ -380,8 +417,8 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
             draw.line([(coords[0]+offset,coords[1]),(coords[0],coords[1]+height)] ,fill='black', width=1)
             draw.line([(coords[0]+width+offset,coords[1]),(coords[0]+width,coords[1]+height)] ,fill='black', width=1)
 
-        width = draw.textsize(text,font=font)[0] + font_size * 2
-        height = draw.textsize(text,font=font)[1] + font_size
+        width = text_size(font,text)[0] + font_size * 2
+        height = text_size(font,text)[1] + font_size
         offset = font_size
 
         x = width_offset + combined_widths[position[0]] + branch_width[position[0]]/2 - width/2  - offset/2
@@ -393,7 +430,7 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
 
         return height
     
-    def Flowline(role,position,height,chart_code,width):
+    def Flowline(role,position,height,last_row,width):
 
         def arrow(coords, height,direction):
             h = int(height)
@@ -470,22 +507,12 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
             start = combined_heights[position[1]]+height/2
             distance = combined_heights[position[1]+1] - start
             
-            even_branch = [position[0]*2,0]
-            odd_branch = [position[0]*2+1,0]
-            associated_while = [position[0],0]
-            
-            # This searches for the ENDWHILE's corresponding while loop
-            # It also looks for the branches created by that while
-            
-            for obj in reversed(chart_code):
-                if obj['position'][0] == even_branch[0] and even_branch[1] == 0:
-                    even_branch[1] = obj['position'][1]
-                if obj['position'][0] == odd_branch[0] and odd_branch[1] == 0:
-                    odd_branch[1] = obj['position'][1]
-                if obj['position'][0] == associated_while[0] and associated_while[1] == 0:
-                    associated_while[1] = obj['position'][1]
-                if even_branch[1] != 0 and associated_while[1] !=0 and odd_branch[1] !=0:
-                    break
+            # The ENDWHILE's corresponding while loop is the last block drawn on this branch,
+            # the ends of the branches created by that while are the last blocks drawn on them
+            
+            even_branch = [position[0]*2,last_row.get(position[0]*2,0)]
+            odd_branch = [position[0]*2+1,last_row.get(position[0]*2+1,0)]
+            associated_while = [position[0],last_row.get(position[0],0)]
                     
             even_axis = width_offset + combined_widths[2*position[0]] + branch_width[2*position[0]]/2
             
@@ -525,19 +552,11 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
             draw.line([(axis,start),(axis,start+distance)], fill='black', width=1)
             arrow([axis,start+2*distance/3],block_gap/3,"down")
             
-            even_branch = [position[0]*2,0]
-            odd_branch = [position[0]*2+1,0]
-            
-            # This searches for the last objects in the two branches created by an IF statement
+            # The last objects in the two branches created by an IF statement
             # This IF statement is the one that is closed by the ENDIF
             
-            for obj in reversed(chart_code):
-                if obj['position'][0] == odd_branch[0] and odd_branch[1] == 0:
-                    odd_branch[1] = obj['position'][1]
-                elif obj['position'][0] == even_branch[0] and even_branch[1] == 0:
-                    even_branch[1] = obj['position'][1]
-                if even_branch[1] != 0 and odd_branch[1] != 0:
-                    break
+            even_branch = [position[0]*2,last_row.get(position[0]*2,0)]
+            odd_branch = [position[0]*2+1,last_row.get(position[0]*2+1,0)]
 
             even_axis = width_offset + combined_widths[2*position[0]] + branch_width[2*position[0]]/2
             odd_axis = width_offset + combined_widths[2*position[0]+1] + branch_width[2*position[0]+1]/2
@@ -560,7 +579,7 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
             
     font_path = font_data['path']
     font_size = font_data['size']
-    font = ImageFont.truetype(font_path, font_size)
+    font = get_font(font_path, font_size)
 
     scale_constant = int(font_size/2)
     block_gap = font_size * 3/2
@@ -568,10 +587,15 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
     height_offset = 2 * font_size
     width_offset = 2 * font_size
 
-    tree = newTree([i for i in range(1,max_branch+1)], "levelorder") # creates a binary tree
+    # Branches are numbered like a binary tree (a decision on branch b opens 2b and 2b+1)
+    used_branches = set(branch_width.keys())
+    for block in chart_code:
+        used_branches.add(block['position'][0])
+        if block['type'] == 'Decision':
+            used_branches.update((2*block['position'][0], 2*block['position'][0]+1))
     
-    #tree_struct is an array version of a tree which looks like this [2,1,3]
-    tree_struct = tree.serializeInOrder(tree.root)
+    #tree_struct is the in-order sequence of the branches in use, which looks like this [2,1,3]
+    tree_struct = inOrder(used_branches)
 
     combined_widths = {} # The pixel at which each branch starts at on x-axis
     
@@ -600,12 +624,18 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
     img_width = int(combined_widths[list(combined_widths.keys())[-1]] + branch_width[list(combined_widths.keys())[-1]] + width_offset*2)
     img_height = int(combined_heights[max_y] + layer_height[max_y] + height_offset)
 
-    img = Image.new('RGB', (img_width, img_height), color = 'white')
-    draw = ImageDraw.Draw(img)
+    # The surface decides where primitives go: one image, an SVG stream or PNG tiles
+    if surface is None:
+        surface = RasterSurface()
+    draw = surface.begin(img_width, img_height)
     
     # Goes throught each line of chart code and draws it. Then it handles
     # that line's flowlines depending on its role
     
+    # last_row keeps the layer of the last block drawn on each branch,
+    # so connectors find the ends of their branches without scanning back
+    last_row = {}
+    
     width = 0
     for i in range(0,len(chart_code)):
         block = chart_code[i]
@@ -618,30 +648,63 @@ def drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data):
         elif block['type'] == 'Decision':
             height,width = Decision(block['content'],block['position'])
         elif block['type'] == 'Connector':
-            height = draw.textsize("c",font=font)[1] + font_size
+            height = text_size(font,"c")[1] + font_size
             
-        Flowline(block['role'],block['position'],height,chart_code[0:i],width)
+        Flowline(block['role'],block['position'],height,last_row,width)
+        last_row[block['position'][0]] = block['position'][1]
             
     del draw
     
-    return img
+    return surface.finish()
+
+def render_png(text,font_size=20,font_path=BUNDLED_FONT):
+    """
+    Render pseudocode text to PNG bytes in memory.
+
+    Args:
+    - text (str): IGCSE pseudocode.
+    - font_size (int): Font size, which scales the whole chart.
+    - font_path (str): TrueType font file.
+
+    Returns:
+    - bytes: The encoded PNG image.
+    """
+    font_data = {"path":font_path,"size":font_size}
+
+    chart_code,max_branch,max_y,layer_height,branch_width = translation(preprocess(text.splitlines()),font_data)
+
+    flowchart = drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data)
+
+    buffer = io.BytesIO()
+    flowchart.save(buffer, format="PNG")
+    return buffer.getvalue()
 
 @click.command()
 @click.option('--size', default=20, help="The size of the flowchart")
 @click.option('--font', default=r"./fonts/NotoSans-Regular.ttf", help="The font's path")
 @click.option('--code', default="enter.txt", help="The file with pseudocode")
 @click.option('--output', default="flowchart.png", help="The output image")
+@click.option('--format', 'output_format', default="png", type=click.Choice(["png", "svg", "png-tiled"]),
+              help="png renders in memory, svg streams vector output, png-tiled renders the PNG tile by tile")
+@click.option('--tile-size', default=1024, help="Tile height in pixels for png-tiled")
 
-def main(size,code,output,font):
+def main(size,code,output,font,output_format,tile_size):
     lines = read(code)
 
     font_data = {"path":font,"size":size}
     
     chart_code,max_branch,max_y,layer_height,branch_width = translation(lines,font_data)
 
-    flowchart = drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data)
+    if output_format == "svg":
+        with open(output,"w",encoding="utf-8") as stream:
+            drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data,SvgSurface(stream))
+    elif output_format == "png-tiled":
+        with open(output,"wb") as stream:
+            drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data,TiledPngSurface(stream,tile_size))
+    else:
+        flowchart = drawer(chart_code,max_branch,max_y,layer_height,branch_width,font_data)
 
-    flowchart.save(output)
+        flowchart.save(output)
 
 if __name__ == '__main__':
     main() 
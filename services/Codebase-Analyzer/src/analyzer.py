@@ -1,72 +1,78 @@
-from code_analyzer import CodeAnalyzer  # type: ignore
+from sandbox import SandboxError, run_job
+from instrumentation import span
 import os
-import ast
-import re
+
+# Marker of the report section returned to clients
+REPORT_SECTION_MARKER = "Line of code Analysis"
+
+# Only the section markup is rendered, without the HTML page around it
+REPORT_SECTION_FORMAT = "{code}"
 
 # for code analysis
 def analyze_code(code):
     """
-    Analyze the provided code and return the exported analysis reports.
-    deletes the generated HTML report after reading.
+    Analyze the provided code in a sandbox worker and return the "Line of code Analysis" report section.
+    CodeAnalyzer traces through the process-global sys.settrace, so every analysis runs in
+    its own worker process. Safe to call from concurrent requests: nothing is written to disk.
     
     Args:
     - code (str): The source code to analyze.
     
     Returns:
-    - dict: Contains the exported HTML report or a specific portion of it.
+    - dict: Contains the HTML of the report section, or an error.
+    
+    Raises:
+    - SandboxError: When the job times out, exceeds its memory limit or crashes its worker.
     """
     try:
-        # Initialize the CodeAnalyzer
-        code_analyzer = CodeAnalyzer()
-        code_analyzer.start()
-        
-        # Record the code for analysis
-        code_analyzer.record_comment_for_interpretable_next(code)
-        
-        # Define a dummy function to simulate code execution and analysis
-        def dummy_function(depth: int) -> int:
-            code_analyzer.record_comment_for_interpretable_previous({"__depth": depth})
-            if depth <= 0:
-                code_analyzer.record_comment_for_interpretable_next({"Final depth": depth})
-                return depth
-            return dummy_function(depth - 1)
+        return run_job(run_code_analyzer, code)
+    except SandboxError:
+        raise
+    except Exception as e:
+        print(f"Error analyzing code: {str(e)}")
+        return {"error": "An error occurred during code analysis"}
 
-        # Execute the dummy function to analyze the provided code
-        dummy_function(5)
-        
-        # Stop the analyzer
-        code_analyzer.stop()
+def run_code_analyzer(code):
+    """
+    Run CodeAnalyzer over the provided code and capture its report in memory.
+    Called through run_job, so it runs in a sandbox worker under the pool's time and memory limits.
+    """
+    try:
+        # code_analyzer pulls in pandas, so it is only imported by the first analysis (see warmup.py)
+        from code_analyzer import CodeAnalyzer  # type: ignore
+
+        with span("code_analyzer"):
+            # Initialize the CodeAnalyzer
+            code_analyzer = CodeAnalyzer()
+            code_analyzer.start()
         
-        # Export the analysis report to HTML
-        code_analyzer.get_code_analyzer_printer().export_rich_to_html()
+            # Record the code for analysis
+            code_analyzer.record_comment_for_interpretable_next(code)
         
-        # Read the generated HTML report
-        report_filename = "__main___code_analysis_rich.html"
-        if os.path.exists(report_filename):
-            with open(report_filename, "r", encoding="utf-8") as html_file:
-                html_report = html_file.read()
-
-            # Delete the report file after reading
-            os.remove(report_filename)
+            # Define a dummy function to simulate code execution and analysis
+            def dummy_function(depth: int) -> int:
+                code_analyzer.record_comment_for_interpretable_previous({"__depth": depth})
+                if depth <= 0:
+                    code_analyzer.record_comment_for_interpretable_next({"Final depth": depth})
+                    return depth
+                return dummy_function(depth - 1)
 
-            # Find the specific HTML section
-            marker = (
-                '<span class="r1">Line of code Analysis</span>'
-            )
-            start_index = html_report.find(marker)
+            # Execute the dummy function to analyze the provided code
+            dummy_function(5)
+        
+            # Stop the analyzer
+            code_analyzer.stop()
 
-            if start_index != -1:
-                html_report = html_report[start_index:]
-            else:
-                html_report = "Specified HTML section not found."
+        with span("html_export"):
+            html_report = export_report_section(code_analyzer)
 
-            # Check if the HTML report is empty
-            if not html_report.strip():
-                html_report = "HTML report generation failed or returned empty."
-        else:
-            html_report = "Report file not found."
+        # Check if the HTML report is empty
+        if html_report is None:
+            html_report = "Specified HTML section not found."
+        elif not html_report.strip():
+            html_report = "HTML report generation failed or returned empty."
 
-        # Return the HTML report or the specific portion
+        # Return the specific portion of the HTML report
         return {
             "analysis_report_html": html_report
         }
@@ -75,4 +81,37 @@ def analyze_code(code):
         print(f"Error analyzing code: {str(e)}")
         return {"error": "An error occurred during code analysis"}
 
+def export_report_section(code_analyzer):
+    """
+    Render the analyzer report into a recording console and export only the section
+    starting at REPORT_SECTION_MARKER as HTML.
+    
+    Returns:
+    - str or None: The section markup, or None when the marker is missing.
+    """
+    from rich.console import Console
+    from rich.text import Text
+
+    class SectionConsole(Console):
+        # Records nothing before the header text containing the marker, which is cut at the marker
+        started = False
+
+        def print(self, *objects, **kwargs):
+            if not self.started:
+                for i, obj in enumerate(objects):
+                    if isinstance(obj, Text) and REPORT_SECTION_MARKER in obj.plain:
+                        self.started = True
+                        objects = (obj[obj.plain.index(REPORT_SECTION_MARKER):],) + objects[i + 1:]
+                        break
+                else:
+                    return
+            super().print(*objects, **kwargs)
+
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        # Same console export_rich_to_html uses, but printing nowhere
+        console = SectionConsole(soft_wrap=True, record=True, file=devnull)
+        code_analyzer.get_code_analyzer_printer().print_rich(console)
 
+    if not console.started:
+        return None
+    return console.export_html(code_format=REPORT_SECTION_FORMAT)
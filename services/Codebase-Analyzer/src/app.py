@@ -1,6 +1,22 @@
-from flask import Flask, jsonify, request
-from utils import generate_flowchart_from_code, flowchart_from_code, detect_functions_from_code, flowchart_from_snippet
+import io
+from flask import Flask, Response, jsonify, request, stream_with_context
+from utils import generate_flowchart_from_code, flowchart_from_code, cached_functions, flowchart_from_snippet, remove_unexpected_indent, flowchart_cache, functions_cache, analyze_bundle, BUNDLE_SECTIONS
 from analyzer import analyze_code
+from code_metrics import compute_metrics
+from sandbox import SandboxError, run_job
+from definition_index import definition_index_for, definition_index_cache
+from incremental import definition_cache, detect_functions_incremental, flowchart_incremental
+from archive import ARCHIVE_SECTIONS, ArchiveError, open_archive, stream_archive_results
+from serving import Overloaded, gate_stats, gated, get_gate, serve
+from layout import LAYOUTS
+from callgraph import call_graph_cache, call_graph_for
+from cache import content_key
+from rendering import render_cache, render_png
+from instrumentation import METRICS_ENABLED, instrument_app, render_metrics
+from payloads import PayloadError, limit_request_bodies
+from store import result_store
+from warmup import preload_if_configured
+from graph_format import FormatNotAcceptable, encode_compact_graph, negotiate_graph_format
 from flask_cors import CORS
 
 # TODO :REMOVE CORS 
@@ -11,6 +27,19 @@ CORS(app)
 # Disable strict slashes for URL routing
 app.url_map.strict_slashes = False
 
+# Per-endpoint request and stage timings, served from /metrics
+instrument_app(app)
+
+# Body size limits (MAX_REQUEST_BODY), gzip request bodies and gzip JSON responses
+limit_request_bodies(app)
+
+# Requests shed by an endpoint gate
+@app.errorhandler(Overloaded)
+def handle_overloaded(e):
+    response = jsonify({"error": str(e)})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, e.status_code
+
 # Health Checking Endpoint
 @app.route('/test-ag', methods=['GET'])
 def hello_world():
@@ -19,7 +48,56 @@ def hello_world():
     """
     return 'Hello from Service 1!'
 
+# Cache Statistics Endpoint
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """
+    Endpoint to inspect the flowchart result cache.
+
+    Returns:
+    {
+        "flowchart": {"size", "maxsize", "ttl", "hits", "misses", "evictions", "expirations", "store_hits", "hit_ratio"},
+        "functions": {...same counters...},
+        "definition_index": {...same counters...},
+        "definitions": {...same counters...},
+        "call_graph": {...same counters...},
+        "render": {...same counters...},
+        "gates": {<endpoint>: {"active", "waiting", "max_concurrent", "max_queued", "admitted", "rejected"}},
+        "store": {"path", "entries", "bytes", "max_bytes", "hits", "misses", "writes", "evictions", "errors", "hit_ratio"} or null when disabled
+    }
+    """
+    return jsonify({
+        "flowchart": flowchart_cache.stats(),
+        "functions": functions_cache.stats(),
+        "definition_index": definition_index_cache.stats(),
+        "definitions": definition_cache.stats(),
+        "call_graph": call_graph_cache.stats(),
+        "render": render_cache.stats(),
+        "gates": gate_stats(),
+        "store": result_store.stats() if result_store is not None else None,
+    })
+
+# Metrics Endpoint
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Endpoint to scrape request counters and latency histograms in the Prometheus text format.
+
+    Returns:
+    codewizard_requests_total{endpoint,status}, codewizard_request_duration_seconds{endpoint}
+    and codewizard_stage_duration_seconds{endpoint,stage}, where stage is the name of a span
+    recorded while serving the endpoint (parse, graph, astor, layout, pyflowchart, code_analyzer,
+    html_export, json, msgpack, gzip, sandbox, ...).
+    """
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled (METRICS_ENABLED=0)"}), 404
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 # Flowchart Generation Endpoint
+# The flowchart endpoints only take a gate slot on a cache miss
+flowchart_gate = get_gate('generate-flowchart-ag')
+flowchart_ag2_gate = get_gate('generate-flowchart-ag2')
+
 @app.route('/generate-flowchart-ag', methods=['POST'])
 def generate_flowchart():
     """
@@ -50,13 +128,20 @@ def generate_flowchart():
         if language not in valid_languages:
             return jsonify({"error": f"Unsupported language '{language}'. Supported languages: {', '.join(valid_languages)}."}), 400
 
-        flowchart_data = flowchart_from_code(code)
+        flowchart_data = flowchart_from_code(code, gate=flowchart_gate)
 
         if not flowchart_data:
             return jsonify({"error": "No data To Show."}), 500
 
         return jsonify(flowchart_data)
 
+    except Overloaded:
+        # Raised by the gate on a cache miss, answered by handle_overloaded
+        raise
+
+    except SandboxError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
     except Exception as e:
         print(f"Error generating flowchart: {str(e)}")
         return jsonify({"error": "An error occurred while generating the flowchart"}), 500
@@ -71,7 +156,8 @@ def generate_flowchart_ag2():
     {
         "code": "<source_code>",
         "language": "<programming_language>",
-        "function": "<function_name>" (optional)
+        "function": "<function_name>" (optional),
+        "incremental": true (optional, cache per definition so edits elsewhere in the file stay cached)
     }
     
     Returns:
@@ -83,6 +169,7 @@ def generate_flowchart_ag2():
         code = request.json.get('code', '')
         language = request.json.get('language', '').lower()
         function = request.json.get('function', '')
+        incremental = request.json.get('incremental', False)
 
         # Validate code input
         if not code:
@@ -97,7 +184,10 @@ def generate_flowchart_ag2():
             return jsonify({"error": f"Unsupported language '{language}'. Supported languages: {', '.join(valid_languages)}."}), 400
 
         # Generate flowchart data
-        flowchart_data = flowchart_from_snippet(code, function)
+        if incremental:
+            flowchart_data = flowchart_incremental(code, function, gate=flowchart_ag2_gate)
+        else:
+            flowchart_data = flowchart_from_snippet(code, function, gate=flowchart_ag2_gate)
 
         # Handle case when no flowchart data is returned
         if not flowchart_data:
@@ -108,35 +198,137 @@ def generate_flowchart_ag2():
         # Return the flowchart data if successful
         return jsonify(flowchart_data)
 
+    except Overloaded:
+        # Raised by the gate on a cache miss, answered by handle_overloaded
+        raise
+
+    except SandboxError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
     except Exception as e:
         print(f"Error generating flowchart: {str(e)}")
         return jsonify({"error": "An error occurred while generating the flowchart"}), 500
 
     
 
+# Flowchart Graph Endpoint
+@app.route('/generate-graph', methods=['POST'])
+@gated('generate-graph')
+def generate_graph():
+    """
+    Endpoint to build the positioned node/edge graph of the provided code.
+    
+    Expects JSON input with the following structure:
+    {
+        "code": "<source_code>",
+        "language": "python",
+        "layout": "grid" | "layered" (optional, defaults to "grid")
+    }
+    
+    The wire format is chosen with ?format=json|compact|msgpack, or else the Accept header
+    (application/json, application/vnd.codewizard.graph+json, application/vnd.codewizard.graph+msgpack).
+    msgpack answers 406 when the msgpack package is not installed.
+    
+    Returns (json):
+    {
+        "nodes": [{"id", "label", "position": {"x", "y"}}, ...],
+        "edges": [{"id", "source", "target", "label" (optional)}, ...],
+        "pretty_code": "<normalized source>"
+    }
+    
+    Returns (compact, and msgpack with the same structure; edges index into the node arrays):
+    {
+        "version": 2,
+        "nodes": {"label": [...], "x": [...], "y": [...], "id": [...] (only when ids are not "1".."n")},
+        "edges": {"source": [...], "target": [...], "label": {"<edge index>": "<label>", ...}},
+        "pretty_code": "<normalized source>"
+    }
+    """
+    try:
+        code = request.json.get('code', '')
+        language = request.json.get('language', 'python').lower()
+        layout = request.json.get('layout', 'grid')
+
+        if not code or not code.strip():
+            return jsonify({"error": "No code provided"}), 400
+
+        if language != 'python':
+            return jsonify({"error": f"Unsupported language '{language}'. Supported languages: python."}), 400
+
+        if layout not in LAYOUTS:
+            return jsonify({"error": f"Unsupported layout '{layout}'. Supported layouts: {', '.join(LAYOUTS)}."}), 400
+
+        # Negotiated before any work is done, so a 406 costs nothing
+        graph_format = negotiate_graph_format(request.args.get('format', ''), request.accept_mimetypes)
+
+        try:
+            graph = run_job(generate_flowchart_from_code, remove_unexpected_indent(code), language, None, layout)
+        except SyntaxError as se:
+            return jsonify({"error": f"SyntaxError: {str(se)}"}), 400
+
+        if graph_format == "json":
+            response = jsonify(graph)
+        else:
+            body, mimetype = encode_compact_graph(graph, graph_format)
+            response = Response(body, mimetype=mimetype)
+        response.vary.add('Accept')
+        return response, 200
+
+    except FormatNotAcceptable as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    except SandboxError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    except Exception as e:
+        print(f"Error generating graph: {str(e)}")
+        return jsonify({"error": "An error occurred while generating the graph"}), 500
+
 # Code Analysis Endpoint
 @app.route('/analyze-code', methods=['POST'])
+@gated('analyze-code')
 def analyze_code_endpoint():
     """
     Endpoint to analyze the provided code.
     
     Expects JSON input with the following structure:
     {
-        "code": "<source_code>"
+        "code": "<source_code>",
+        "engine": "code_analyzer" | "native" (optional, defaults to "code_analyzer")
     }
     
-    Returns:
+    Returns (code_analyzer engine):
+    {
+        "analysis_report_html": "<Line of code Analysis section of the CodeAnalyzer report>"
+    }
+    
+    Returns (native engine):
     {
         "num_functions": <number_of_functions>,
-        "num_lines": <number_of_lines> 
+        "num_classes": <number_of_classes>,
+        "num_lines": <number_of_lines>,
+        "loc", "sloc", "blank_lines", "comment_lines", "comment_ratio",
+        "module_complexity", "max_nesting", "halstead": {...},
+        "functions": [{"name", "qualname", "lineno", "end_lineno", "complexity", "max_nesting",
+                       "halstead", "loc", "sloc", "blank_lines", "comment_lines", "comment_ratio"}, ...]
     }
     """
     try:
         code = request.json.get('code', '')
+        engine = request.json.get('engine', 'code_analyzer')
 
         if not code:
             return jsonify({"error": "No code provided"}), 400
 
+        if engine == 'native':
+            try:
+                return jsonify(run_job(compute_metrics, code))
+            except SyntaxError as se:
+                return jsonify({"error": f"SyntaxError: {str(se)}"}), 400
+
+        if engine != 'code_analyzer':
+            return jsonify({"error": f"Unsupported engine '{engine}'. Supported engines: code_analyzer, native."}), 400
+
         analysis_result = analyze_code(code)
 
         if "error" in analysis_result:
@@ -144,6 +336,9 @@ def analyze_code_endpoint():
 
         return jsonify(analysis_result)
 
+    except SandboxError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
     except Exception as e:
         print(f"Error analyzing code: {str(e)}")
         return jsonify({"error": "An error occurred while analyzing the code"}), 500
@@ -156,25 +351,31 @@ def detect_functions():
     
     Expects JSON input with the following structure:
     {
-        "code": "<source_code>"
+        "code": "<source_code>",
+        "incremental": true (optional, only re-parse top-level definitions that changed)
     }
     
     Returns:
     {
         "functions": [<function1>, <function2>, ...],
         "imports": [<import1>, <import2>, ...],
-        "errors": [<error1>, <error2>, ...]
+        "errors": [<error1>, <error2>, ...],
+        "recomputed": <number of definitions parsed> (incremental only)
     }
     """
     try:
         # Retrieve code from the JSON request
         code = request.json.get('code', '')
+        incremental = request.json.get('incremental', False)
 
         if not code:
             return jsonify({"error": "No code provided"}), 400
 
         # Detect functions, imports, and errors
-        result = detect_functions_from_code(code)
+        if incremental:
+            result = detect_functions_incremental(code)
+        else:
+            result = cached_functions(code)
 
         # Send back the results
         return jsonify(result), 200
@@ -192,6 +393,273 @@ def detect_functions():
         print(f"Error detecting functions: {str(e)}")
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     
+# combined analysis endpoint
+@app.route('/analyze-bundle', methods=['POST'])
+@gated('analyze-bundle')
+def analyze_bundle_endpoint():
+    """
+    Endpoint to run several analyses over a single parse of the provided code.
+    
+    Expects JSON input with the following structure:
+    {
+        "code": "<source_code>",
+        "language": "python",
+        "function": "<function_name>" (optional, field for the flowchart section),
+        "sections": ["functions", "flowchart", "graph", "metrics"] (optional, defaults to all)
+    }
+    
+    Returns:
+    {
+        "functions": <same as /detect-functions>,
+        "flowchart": <flowchart.js DSL, same as /generate-flowchart-ag2>,
+        "graph": {"nodes": [...], "edges": [...], "pretty_code": "..."},
+        "metrics": <same as /analyze-code with engine=native>,
+        "errors": {<section>: <error message>, ...}
+    }
+    """
+    try:
+        code = request.json.get('code', '')
+        language = request.json.get('language', 'python').lower()
+        function = request.json.get('function', '')
+        sections = request.json.get('sections', list(BUNDLE_SECTIONS))
+
+        if not code or not code.strip():
+            return jsonify({"error": "No code provided"}), 400
+
+        if language != 'python':
+            return jsonify({"error": f"Unsupported language '{language}'. Supported languages: python."}), 400
+
+        unknown = [section for section in sections if section not in BUNDLE_SECTIONS]
+        if unknown:
+            return jsonify({"error": f"Unknown sections: {', '.join(map(str, unknown))}. Supported sections: {', '.join(BUNDLE_SECTIONS)}."}), 400
+
+        # The whole bundle runs as one sandboxed job
+        return jsonify(run_job(analyze_bundle, code, function, sections)), 200
+
+    except SandboxError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    except Exception as e:
+        print(f"Error analyzing bundle: {str(e)}")
+        return jsonify({"error": "An error occurred while analyzing the code"}), 500
+
+# cursor position lookup endpoint
+@app.route('/locate-definition', methods=['POST'])
+def locate_definition():
+    """
+    Endpoint to find the function/method/class containing a line.
+    The definition index is cached per source hash, so repeated lookups do not re-parse.
+    
+    Expects JSON input with the following structure:
+    {
+        "code": "<source_code>" (or "source_hash" from a previous response),
+        "line": <1-based line number>
+    }
+    
+    Returns:
+    {
+        "source_hash": "<hash to send instead of code next time>",
+        "line": <line>,
+        "definition": {"name", "qualname", "kind", "lineno", "end_lineno"} or null,
+        "enclosing": [<outermost definition>, ..., <innermost definition>]
+    }
+    """
+    try:
+        code = request.json.get('code', '')
+        key = request.json.get('source_hash', '')
+        line = request.json.get('line')
+
+        if not isinstance(line, int) or isinstance(line, bool) or line < 1:
+            return jsonify({"error": "'line' must be a positive integer"}), 400
+
+        if code:
+            key, index = definition_index_for(code)
+        elif key:
+            index = definition_index_cache.get(key)
+            if index is None:
+                return jsonify({"error": "Unknown source_hash, please resend the code"}), 404
+        else:
+            return jsonify({"error": "No code provided"}), 400
+
+        enclosing = [
+            {field: definition[field] for field in ("name", "qualname", "kind", "lineno", "end_lineno")}
+            for definition in index.lookup(line)
+        ]
+        return jsonify({
+            "source_hash": key,
+            "line": line,
+            "definition": enclosing[-1] if enclosing else None,
+            "enclosing": enclosing,
+        }), 200
+
+    except Exception as e:
+        print(f"Error locating definition: {str(e)}")
+        return jsonify({"error": "An error occurred while locating the definition"}), 500
+
+# call graph endpoint
+@app.route('/call-graph', methods=['POST'])
+def call_graph():
+    """
+    Endpoint to get the module-wide call graph, or the callers/callees of one definition.
+    The graph is cached per source hash, so follow-up queries can send the hash instead of the code.
+    
+    Expects JSON input with the following structure:
+    {
+        "code": "<source_code>" (or "source_hash" from a previous response),
+        "function": "<name as in /detect-functions, e.g. Class.method>" (optional)
+    }
+    
+    Returns (whole module, edges as indexes into "nodes"):
+    {
+        "source_hash": "<hash to send instead of code next time>",
+        "nodes": ["<module>", <name>, ...],
+        "lines": [<definition line per node>, ...],
+        "callees": [[<node index>, ...], ...],
+        "callers": [[<node index>, ...], ...],
+        "external": [[<unresolved call>, ...], ...]
+    }
+    
+    Returns (single function):
+    {
+        "source_hash": "...",
+        "function": "<name>",
+        "callers": [<name>, ...],
+        "callees": [<name>, ...],
+        "external": [<unresolved call>, ...]
+    }
+    """
+    try:
+        code = request.json.get('code', '')
+        key = request.json.get('source_hash', '')
+        function = request.json.get('function', '')
+
+        if code:
+            try:
+                key, graph = call_graph_for(code)
+            except SyntaxError as se:
+                return jsonify({"error": f"SyntaxError: {str(se)}"}), 400
+        elif key:
+            graph = call_graph_cache.get(key)
+            if graph is None:
+                return jsonify({"error": "Unknown source_hash, please resend the code"}), 404
+        else:
+            return jsonify({"error": "No code provided"}), 400
+
+        if not function:
+            return jsonify({"source_hash": key, **graph.to_dict()}), 200
+
+        neighbours = graph.neighbours(function)
+        if neighbours is None:
+            return jsonify({"error": f"Function '{function}' not found in provided code."}), 404
+        return jsonify({"source_hash": key, "function": function, **neighbours}), 200
+
+    except Exception as e:
+        print(f"Error building call graph: {str(e)}")
+        return jsonify({"error": "An error occurred while building the call graph"}), 500
+
+# pseudocode rendering endpoint
+@app.route('/render-pseudocode', methods=['POST'])
+@gated('render-pseudocode')
+def render_pseudocode():
+    """
+    Endpoint to render IGCSE pseudocode as a PNG flowchart.
+    Images are cached by content hash, which is also the ETag: send it back in
+    If-None-Match to get a 304 without any rendering.
+    
+    Expects JSON input with the following structure:
+    {
+        "code": "<pseudocode>",
+        "size": <font size> (optional, defaults to 20)
+    }
+    
+    Returns:
+    image/png bytes, or 304 Not Modified
+    """
+    try:
+        code = request.json.get('code', '')
+        size = request.json.get('size', 20)
+
+        if not code or not code.strip():
+            return jsonify({"error": "No code provided"}), 400
+
+        if not isinstance(size, int) or isinstance(size, bool) or not 8 <= size <= 72:
+            return jsonify({"error": "'size' must be an integer between 8 and 72"}), 400
+
+        etag = content_key("render", code, str(size))
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        png = render_cache.get(etag)
+        if png is None:
+            try:
+                png = run_job(render_png, code, size)
+            except (KeyError, IndexError, ValueError) as e:
+                # Unbalanced IF/ELSE/ENDIF or WHILE/ENDWHILE blocks
+                return jsonify({"error": f"Could not parse the pseudocode: {type(e).__name__}: {str(e)}"}), 400
+            render_cache.set(etag, png)
+
+        response = Response(png, mimetype='image/png')
+        response.set_etag(etag)
+        return response
+
+    except SandboxError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    except Exception as e:
+        print(f"Error rendering pseudocode: {str(e)}")
+        return jsonify({"error": "An error occurred while rendering the pseudocode"}), 500
+
+# repository archive analysis endpoint
+@app.route('/analyze-archive', methods=['POST'])
+def analyze_archive():
+    """
+    Endpoint to analyze every Python file in a zip or tar (.tar, .tar.gz, ...) archive.
+    The archive is read as a stream and files are analyzed in parallel worker processes.
+    
+    Expects either a multipart upload with the archive in the "file" field,
+    or the raw archive as the request body (optionally Content-Encoding: gzip). Optional query parameter:
+    sections=functions,flowchart
+    
+    Returns (application/x-ndjson, one line per file as it completes):
+    {"path": "<member path>", "functions": {...}, "flowchart": "...", "errors": {...}}
+    ...
+    {"summary": {"files": <count>, "failed": <count>}}
+    A tar archive found to be corrupt part way through ends with {"error": "...", "summary": {...}} instead.
+    Uploads that are empty or corrupt (400), too large (413) or not a zip/tar archive (415) get a JSON error.
+    """
+    try:
+        sections = request.args.get('sections', ','.join(ARCHIVE_SECTIONS)).split(',')
+        unknown = [section for section in sections if section not in ARCHIVE_SECTIONS]
+        if unknown:
+            return jsonify({"error": f"Unknown sections: {', '.join(unknown)}. Supported sections: {', '.join(ARCHIVE_SECTIONS)}."}), 400
+
+        # The archive is identified and opened here, so unreadable uploads get an error status
+        # instead of a truncated stream
+        upload = request.files.get('file')
+        if upload is not None:
+            # Take the uploaded file over from the request, which closes its files before the response is streamed
+            stream, upload.stream = upload.stream, io.BytesIO()
+            sources = open_archive(stream, close=True)
+        elif request.content_length or request.headers.get('Transfer-Encoding') == 'chunked' or request.environ.get('wsgi.input_terminated'):
+            # A gzip body has no known length once decoded
+            sources = open_archive(request.stream)
+        else:
+            return jsonify({"error": "No archive provided"}), 400
+
+        return Response(stream_with_context(stream_archive_results(sources, sections)), mimetype='application/x-ndjson')
+
+    except (ArchiveError, PayloadError) as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    except Exception as e:
+        print(f"Error analyzing archive: {str(e)}")
+        return jsonify({"error": "An error occurred while analyzing the archive"}), 500
+
 # Entry point to start the Flask application
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=3001)
+    # Backends load on first use unless PRELOAD_BACKENDS=1, see warmup.py
+    preload_if_configured()
+    # SERVE_MODE=asgi serves through uvicorn, see serving.py
+    serve(app, host='0.0.0.0', port=3001)
@@ -0,0 +1,300 @@
+import atexit
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from payloads import PayloadError
+from sandbox import SANDBOX_MEMORY_LIMIT, SANDBOX_TIMEOUT, SandboxError, SandboxPool
+from utils import analyze_bundle
+
+# Limits applied while reading an uploaded archive
+MAX_ARCHIVE_MEMBERS = int(os.environ.get("MAX_ARCHIVE_MEMBERS", 10000))
+MAX_ARCHIVE_MEMBER_BYTES = int(os.environ.get("MAX_ARCHIVE_MEMBER_BYTES", 2 * 1024 * 1024))
+
+# Raw (non-seekable) zip bodies are spooled to disk beyond this size
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+COPY_CHUNK_SIZE = 64 * 1024
+
+# Bytes read ahead to identify an archive: a plain tar has its "ustar" magic at offset 257
+SNIFF_BYTES = 262
+COMPRESSED_TAR_MAGIC = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00")
+
+ARCHIVE_WORKERS = int(os.environ.get("ARCHIVE_WORKERS", os.cpu_count() or 1))
+# Per-file limits, the same as for single requests by default (see sandbox.py)
+ARCHIVE_FILE_TIMEOUT = float(os.environ.get("ARCHIVE_FILE_TIMEOUT", SANDBOX_TIMEOUT))
+ARCHIVE_MEMORY_LIMIT = int(os.environ.get("ARCHIVE_MEMORY_LIMIT", SANDBOX_MEMORY_LIMIT))
+
+# Sections computed per file, a subset of utils.BUNDLE_SECTIONS
+ARCHIVE_SECTIONS = ("functions", "flowchart")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_archive_pool():
+    """
+    Return the pools used for per-file analysis, creating them on first use: a SandboxPool of
+    ARCHIVE_WORKERS processes, which enforces the per-file timeout and memory limit and replaces
+    workers that exceed them, and one thread per worker to feed it.
+
+    Returns:
+    - tuple: (SandboxPool, ThreadPoolExecutor)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool[0].owner_pid != os.getpid():
+            # A file never waits for a worker: there are as many feeding threads as workers
+            sandbox = SandboxPool(size=ARCHIVE_WORKERS, timeout=ARCHIVE_FILE_TIMEOUT,
+                                  memory_limit=ARCHIVE_MEMORY_LIMIT, queue_timeout=None)
+            _pool = (sandbox, ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS))
+            atexit.register(sandbox.close)
+    return _pool
+
+def analyze_source_file(path, code, sections):
+    """
+    Analyze one file from an archive. Runs inside a sandbox worker process.
+
+    Returns:
+    - dict: {"path": <member path>, <section>: ..., "errors": {...}}
+    """
+    if not code.strip():
+        return {"path": path, "errors": {"file": "Empty file"}}
+    return {"path": path, **analyze_bundle(code, '', sections)}
+
+class ArchiveError(Exception):
+    """
+    Upload that cannot be read as an archive. status_code is the HTTP status to answer with.
+    """
+    status_code = 400
+
+class UnsupportedArchive(ArchiveError):
+    status_code = 415
+
+class PeekedStream:
+    """
+    Non-seekable stream whose first bytes were already read: replays them, then continues with the stream.
+    """
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b""
+            return data
+        data, self.head = self.head[:size], self.head[size:]
+        return data
+
+    def close(self):
+        self.stream.close()
+
+def detect_archive_format(stream):
+    """
+    Identify an upload as "zip" or "tar" (plain, gz, bz2, xz) by its magic bytes.
+
+    Returns:
+    - tuple: (format, stream), where stream reads the archive from its first byte again.
+
+    Raises:
+    - ArchiveError: The upload is empty.
+    - UnsupportedArchive: The upload is neither a zip nor a tar archive.
+    """
+    if stream.seekable():
+        head = stream.read(SNIFF_BYTES)
+        stream.seek(0)
+    else:
+        head = stream.read(SNIFF_BYTES)
+        stream = PeekedStream(head, stream)
+
+    if not head:
+        raise ArchiveError("No archive provided")
+    if head.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+        return "zip", stream
+    if head.startswith(COMPRESSED_TAR_MAGIC) or head[257:262] == b"ustar":
+        return "tar", stream
+    raise UnsupportedArchive("Unsupported archive format, expected zip or tar (.tar, .tar.gz, .tar.bz2, .tar.xz)")
+
+def spool_stream(stream):
+    """
+    Copy a stream chunk by chunk into a seekable temporary file that spills to disk when large.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    shutil.copyfileobj(stream, spool, COPY_CHUNK_SIZE)
+    spool.seek(0)
+    return spool
+
+def open_archive(stream, close=False):
+    """
+    Identify and open an archive, so unreadable uploads are rejected before a response starts.
+    Its Python files are then read one member at a time by the returned iterator.
+
+    Tar archives (plain, gz, bz2, xz) are read strictly as a stream. Zip needs random access,
+    so a non-seekable body is first copied to a spooled temporary file.
+
+    Args:
+    - stream (file-like): Binary archive stream.
+    - close (bool): Close stream once the archive has been read.
+
+    Returns:
+    - iterator: (path, code, error) for every Python file in the archive.
+
+    Raises:
+    - ArchiveError: The archive is empty, corrupt or not a zip/tar archive.
+    - PayloadError: The request body could not be read.
+    """
+    try:
+        archive_format, stream = detect_archive_format(stream)
+        if archive_format == "zip":
+            if not stream.seekable():
+                if close:
+                    stream.close()
+                stream, close = spool_stream(stream), True
+            try:
+                archive = zipfile.ZipFile(stream)
+            except (zipfile.BadZipFile, EOFError) as e:
+                raise ArchiveError(f"Could not read the zip archive: {str(e)}")
+            return _iter_zip_sources(archive, stream if close else None)
+        try:
+            archive = tarfile.open(fileobj=stream, mode="r|*")
+        except (tarfile.TarError, EOFError, zlib.error) as e:
+            raise ArchiveError(f"Could not read the tar archive: {str(e)}")
+        return _iter_tar_sources(archive, stream if close else None)
+    except BaseException:
+        if close:
+            stream.close()
+        raise
+
+def _iter_zip_sources(archive, stream):
+    try:
+        count = 0
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.endswith(".py"):
+                continue
+            count += 1
+            if count > MAX_ARCHIVE_MEMBERS:
+                yield info.filename, None, f"Archive has more than {MAX_ARCHIVE_MEMBERS} Python files"
+                return
+            try:
+                with archive.open(info) as member:
+                    source = _decode_member(info.filename, member)
+            except (zipfile.BadZipFile, NotImplementedError, zlib.error, EOFError) as e:
+                source = info.filename, None, f"Could not extract file: {str(e)}"
+            yield source
+    finally:
+        archive.close()
+        if stream is not None:
+            stream.close()
+
+def _iter_tar_sources(archive, stream):
+    try:
+        count = 0
+        while True:
+            try:
+                info = archive.next()
+                if info is None:
+                    return
+                if not info.isfile() or not info.name.endswith(".py"):
+                    continue
+                count += 1
+                if count > MAX_ARCHIVE_MEMBERS:
+                    yield info.name, None, f"Archive has more than {MAX_ARCHIVE_MEMBERS} Python files"
+                    return
+                source = _decode_member(info.name, archive.extractfile(info))
+            except (tarfile.TarError, EOFError, zlib.error) as e:
+                # A stream cannot skip a corrupt member, so the rest of the archive is lost
+                raise ArchiveError(f"Could not read the tar archive: {str(e)}")
+            yield source
+    finally:
+        archive.close()
+        if stream is not None:
+            stream.close()
+
+def _decode_member(path, member):
+    # Never trust the declared size: read at most one byte past the limit
+    data = member.read(MAX_ARCHIVE_MEMBER_BYTES + 1)
+    if len(data) > MAX_ARCHIVE_MEMBER_BYTES:
+        return path, None, f"File exceeds {MAX_ARCHIVE_MEMBER_BYTES} bytes"
+    try:
+        return path, data.decode("utf-8-sig"), None
+    except UnicodeDecodeError as e:
+        return path, None, f"File is not valid UTF-8: {str(e)}"
+
+def stream_archive_results(sources, sections=ARCHIVE_SECTIONS):
+    """
+    Fan Python files out to the archive pool and yield one NDJSON line per file as it completes.
+    A file that times out, runs out of memory or crashes its worker gets an error line of its own.
+    At most two jobs per worker are in flight, so the archive is never fully held in memory.
+    A final {"summary": {...}} line reports totals. When the archive turns out to be unreadable
+    part way through, the files already submitted are still reported and the final line is
+    {"error": "...", "summary": {...}}.
+
+    Args:
+    - sources (iterable): (path, code, error) tuples from open_archive.
+    - sections (iterable): Sections to compute for each file.
+    """
+    max_pending = ARCHIVE_WORKERS * 2
+    pending = {}
+    totals = {"files": 0, "failed": 0}
+
+    def drain():
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            path = pending.pop(future)
+            try:
+                result = future.result()
+            except SandboxError as e:
+                totals["failed"] += 1
+                result = {"path": path, "errors": {"file": str(e)}}
+            except Exception as e:
+                totals["failed"] += 1
+                result = {"path": path, "errors": {"file": f"Analysis failed: {str(e)}"}}
+            yield json.dumps(result) + "\n"
+
+    sections = list(sections)
+    sources = iter(sources)
+    archive_error = None
+    while True:
+        try:
+            path, code, error = next(sources)
+        except StopIteration:
+            break
+        except (ArchiveError, PayloadError) as e:
+            archive_error = str(e)
+            break
+        except Exception as e:
+            print(f"Error reading archive: {str(e)}")
+            archive_error = "An error occurred while reading the archive"
+            break
+
+        totals["files"] += 1
+        if error:
+            totals["failed"] += 1
+            yield json.dumps({"path": path, "errors": {"file": error}}) + "\n"
+            continue
+
+        while len(pending) >= max_pending:
+            yield from drain()
+        sandbox, threads = get_archive_pool()
+        pending[threads.submit(sandbox.run, analyze_source_file, path, code, sections)] = path
+
+    while pending:
+        yield from drain()
+
+    if archive_error is not None:
+        yield json.dumps({"error": archive_error, "summary": totals}) + "\n"
+    else:
+        yield json.dumps({"summary": totals}) + "\n"
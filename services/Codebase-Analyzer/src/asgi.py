@@ -0,0 +1,7 @@
+# ASGI entry point, e.g. `uvicorn asgi:application --app-dir src --port 3001`
+from app import app
+from serving import create_asgi_app
+from warmup import preload_if_configured
+
+preload_if_configured()
+application = create_asgi_app(app)
@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# major seperation: in-process result caching
+def content_key(*parts):
+    """
+    Build a content-addressed cache key from the given parts.
+
+    Args:
+    - *parts (str): Values that identify the cached result (source, function name, ...).
+
+    Returns:
+    - str: Hex sha256 digest of the parts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = str(part).encode("utf-8")
+        # Length prefix keeps ("ab", "c") and ("a", "bc") apart
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+    With a store it is the first level in front of a shared on-disk ResultStore.
+    """
+
+    def __init__(self, maxsize=256, ttl=600, store=None, namespace=None, encode=None, decode=None):
+        """
+        Args:
+        - maxsize (int): Maximum number of entries kept before the least recently used is evicted.
+        - ttl (float): Seconds an entry stays valid. 0 or None disables expiry.
+        - store (store.ResultStore, optional): Second level consulted on misses and written through on set.
+        - namespace (str, optional): Name of this cache's entries in the store.
+        - encode (callable, optional): Turns a value into JSON-serializable data for the store.
+        - decode (callable, optional): Rebuilds a value from the data encode returned.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.namespace = namespace
+        self.encode = encode
+        self.decode = decode
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.store_hits = 0
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for key, or default when missing or expired.
+        Misses fall through to the store, and values found there are kept in memory again.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+
+        if self.store is None:
+            return default
+        value = self.store.get(self.namespace, key, self.ttl)
+        if value is None:
+            return default
+        if self.decode is not None:
+            value = self.decode(value)
+        self._set_local(key, value)
+        with self._lock:
+            self.store_hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Store value under key, evicting the least recently used entries if full.
+        """
+        self._set_local(key, value)
+        if self.store is not None:
+            self.store.set(self.namespace, key, value if self.encode is None else self.encode(value))
+
+    def _set_local(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for key, calling compute() and caching its result on a miss.
+        Falsy results are returned but not cached so error cases are retried.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value:
+                self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """
+        Return the hit/miss/eviction counters along with the current size.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "store_hits": self.store_hits,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
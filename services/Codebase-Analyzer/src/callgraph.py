@@ -0,0 +1,192 @@
+import ast
+import os
+
+from cache import LRUCache, content_key
+from instrumentation import span
+from store import result_store
+
+# Call graphs keyed on the source hash, so callers/callees queries never re-parse
+call_graph_cache = LRUCache(
+    maxsize=int(os.environ.get("CALL_GRAPH_CACHE_SIZE", 128)),
+    ttl=float(os.environ.get("CALL_GRAPH_CACHE_TTL", 1800)),
+    store=result_store,
+    namespace="call_graph",
+    # Only the constructor arguments are stored; the reverse edges are rebuilt from them
+    encode=lambda graph: [graph.names, graph.lines, graph.callees, graph.external],
+    decode=lambda fields: CallGraph(*fields),
+)
+
+MODULE = "<module>"
+# Same definitions detect_functions_from_code reports
+FUNCTION_NODES = (ast.FunctionDef,)
+
+class CallGraph:
+    """
+    Call graph of a module in adjacency-list form.
+
+    Nodes are the definitions detect_functions_from_code reports ("func", "Class.method")
+    plus "<module>" for module and class level code. Edges are stored as index lists.
+    """
+
+    def __init__(self, names, lines, callees, external):
+        self.names = names
+        self.lines = lines
+        self.callees = callees
+        self.external = external
+        self.position = {name: i for i, name in enumerate(names)}
+        self.callers = [[] for _ in names]
+        for caller, targets in enumerate(callees):
+            for callee in targets:
+                self.callers[callee].append(caller)
+
+    def neighbours(self, name):
+        """
+        Return {"callers": [...], "callees": [...], "external": [...]} for one definition,
+        or None when it is not in the graph.
+        """
+        i = self.position.get(name)
+        if i is None:
+            return None
+        return {
+            "callers": [self.names[j] for j in self.callers[i]],
+            "callees": [self.names[j] for j in self.callees[i]],
+            "external": self.external[i],
+        }
+
+    def to_dict(self):
+        return {
+            "nodes": self.names,
+            "lines": self.lines,
+            "callees": self.callees,
+            "callers": self.callers,
+            "external": self.external,
+        }
+
+def get_call_name(call):
+    """
+    Split the callee of an ast.Call into (receiver, name): f() -> (None, "f"),
+    self.m() -> ("self", "m"), a.b.c() -> ("a.b", "c"). Returns None for other callees.
+    """
+    func = call.func
+    if isinstance(func, ast.Name):
+        return None, func.id
+    if isinstance(func, ast.Attribute):
+        parts = []
+        value = func.value
+        while isinstance(value, ast.Attribute):
+            parts.append(value.attr)
+            value = value.value
+        if not isinstance(value, ast.Name):
+            return "", func.attr
+        parts.append(value.id)
+        return ".".join(reversed(parts)), func.attr
+    return None
+
+def build_call_graph(code, tree=None):
+    """
+    Build the call graph of a module in one pass over the AST.
+
+    The pass records every definition and every call site with its enclosing definition and
+    class; calls are then resolved against the resulting symbol table:
+    - f() to the function f, or to C.__init__ when f is a class C of the module;
+    - self.m() / cls.m() to C.m of the enclosing class C or the first of its bases defining m;
+    - C.m() to C.m (or an inherited method) when C is a class of the module.
+    Anything else (builtins, imported modules, other objects) is listed as external.
+    When a name is defined more than once the last definition wins, as in detect_functions_from_code.
+    Async defs are not reported there, so they and the calls inside them are left out.
+
+    Raises:
+    - SyntaxError: When code does not parse.
+    """
+    if tree is None:
+        with span("parse"):
+            tree = ast.parse(code)
+
+    names = [MODULE]
+    lines = [1]
+    position = {MODULE: 0}
+    class_bases = {}
+    call_sites = []  # (caller index, enclosing class, receiver, name)
+
+    # (node, enclosing definition index, enclosing class name, direct child of that class)
+    stack = [(child, 0, None, False) for child in reversed(tree.body)]
+    while stack:
+        node, owner, class_name, in_class_body = stack.pop()
+        child_owner, child_class, child_in_class = owner, class_name, False
+
+        if isinstance(node, ast.AsyncFunctionDef):
+            # Not a node, and its calls must not be credited to the enclosing scope
+            continue
+        if isinstance(node, FUNCTION_NODES):
+            name = f"{class_name}.{node.name}" if in_class_body else node.name
+            if name in position:
+                lines[position[name]] = node.lineno
+            else:
+                position[name] = len(names)
+                names.append(name)
+                lines.append(node.lineno)
+            child_owner = position[name]
+            # self/cls keep referring to the class of the method inside nested functions
+            child_class = class_name
+        elif isinstance(node, ast.ClassDef):
+            class_bases[node.name] = [base.id for base in node.bases if isinstance(base, ast.Name)]
+            child_class, child_in_class = node.name, True
+        elif isinstance(node, ast.Call):
+            callee = get_call_name(node)
+            if callee is not None:
+                call_sites.append((owner, class_name, callee[0], callee[1]))
+
+        for child in reversed(list(ast.iter_child_nodes(node))):
+            stack.append((child, child_owner, child_class, child_in_class and isinstance(child, ast.stmt)))
+
+    def resolve_method(class_name, method):
+        # Breadth-first over the bases defined in this module
+        order = [class_name]
+        for current in order:
+            qualified = f"{current}.{method}"
+            if qualified in position:
+                return position[qualified]
+            order.extend(base for base in class_bases.get(current, []) if base not in order)
+        return None
+
+    callees = [[] for _ in names]
+    external = [[] for _ in names]
+    edge_seen = set()
+    external_seen = set()
+    for owner, class_name, receiver, name in call_sites:
+        target = None
+        if receiver is None:
+            if name in class_bases:
+                target = resolve_method(name, "__init__")
+            else:
+                target = position.get(name)
+        elif receiver in ("self", "cls") and class_name is not None:
+            target = resolve_method(class_name, name)
+        elif receiver in class_bases:
+            target = resolve_method(receiver, name)
+
+        if target is not None:
+            if (owner, target) not in edge_seen:
+                edge_seen.add((owner, target))
+                callees[owner].append(target)
+        else:
+            label = f"{receiver}.{name}" if receiver else name
+            if (owner, label) not in external_seen:
+                external_seen.add((owner, label))
+                external[owner].append(label)
+
+    return CallGraph(names, lines, callees, external)
+
+def call_graph_for(code):
+    """
+    Return the cached CallGraph for code, building it on first use.
+
+    Returns:
+    - tuple: (source_hash, CallGraph)
+    """
+    key = content_key("callgraph", code)
+    graph = call_graph_cache.get(key)
+    if graph is None:
+        graph = build_call_graph(code)
+        call_graph_cache.set(key, graph)
+    return key, graph
@@ -0,0 +1,256 @@
+import ast
+import math
+import re
+from itertools import accumulate
+
+from source_index import SourceIndex
+from instrumentation import span
+
+# Strings are matched whole so a "#" inside them is not taken for a comment
+COMMENT_SCAN_RE = re.compile(
+    r'(?P<string>[rRbBuUfF]{0,2}(?:"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'))'
+    r'|(?P<comment>#[^\r\n]*)'
+)
+
+# Node roles, looked up once per node by concrete type
+FUNCTION, CLASS, NESTING, DECISION, COMPREHENSION, BOOL_OP, OPERATOR, NAME, CONSTANT, ATTRIBUTE = (1 << i for i in range(10))
+
+def _node_roles():
+    roles = {}
+
+    def mark(role, *names):
+        for name in names:
+            node_type = getattr(ast, name, None)  # ast.Match only exists on Python 3.10+
+            if node_type is not None:
+                roles[node_type] = roles.get(node_type, 0) | role
+
+    mark(FUNCTION, "FunctionDef", "AsyncFunctionDef")
+    mark(CLASS, "ClassDef")
+    # Statements that open one level of nesting
+    mark(NESTING, "If", "For", "AsyncFor", "While", "With", "AsyncWith", "Try", "Match")
+    # Nodes adding one decision point to the cyclomatic complexity
+    mark(DECISION, "If", "For", "AsyncFor", "While", "IfExp", "ExceptHandler", "Assert", "match_case")
+    mark(COMPREHENSION, "comprehension")
+    mark(BOOL_OP, "BoolOp")
+    # Halstead operators: every operator node, plus assignments, calls and attribute access.
+    # Halstead operands: names, attribute names and constants.
+    for base in (ast.operator, ast.unaryop, ast.boolop, ast.cmpop):
+        mark(OPERATOR, *(sub.__name__ for sub in base.__subclasses__()))
+    mark(OPERATOR, "Assign", "AugAssign", "AnnAssign", "Call")
+    mark(NAME, "Name")
+    mark(CONSTANT, "Constant")
+    mark(ATTRIBUTE, "Attribute")
+    return roles
+
+NODE_ROLES = _node_roles()
+
+class FunctionMetrics:
+    """
+    Counters gathered for one function during the AST pass.
+    """
+
+    __slots__ = ("name", "qualname", "lineno", "end_lineno", "complexity", "max_nesting",
+                 "operators", "operands", "total_operators", "total_operands")
+
+    def __init__(self, name, qualname, lineno, end_lineno):
+        self.name = name
+        self.qualname = qualname
+        self.lineno = lineno
+        self.end_lineno = end_lineno
+        self.complexity = 1
+        self.max_nesting = 0
+        self.operators = set()
+        self.operands = set()
+        self.total_operators = 0
+        self.total_operands = 0
+
+def halstead(distinct_operators, distinct_operands, total_operators, total_operands):
+    """
+    Derive the Halstead measures from the four base counts.
+    """
+    vocabulary = distinct_operators + distinct_operands
+    length = total_operators + total_operands
+    volume = length * math.log2(vocabulary) if vocabulary > 1 else 0.0
+    difficulty = (distinct_operators / 2) * (total_operands / distinct_operands) if distinct_operands else 0.0
+    return {
+        "distinct_operators": distinct_operators,
+        "distinct_operands": distinct_operands,
+        "total_operators": total_operators,
+        "total_operands": total_operands,
+        "vocabulary": vocabulary,
+        "length": length,
+        "volume": round(volume, 3),
+        "difficulty": round(difficulty, 3),
+        "effort": round(difficulty * volume, 3),
+    }
+
+def line_counts(code, index):
+    """
+    Classify every line as blank, comment-only or code with one regex scan.
+
+    Returns:
+    - tuple: (blank_prefix, comment_prefix) where prefix[i] counts matching lines among the first i.
+    """
+    num_lines = len(index)
+    comment_only = [False] * num_lines
+    has_comment = [False] * num_lines
+
+    line_starts = index.line_starts
+    lineno = 0
+    for match in COMMENT_SCAN_RE.finditer(code):
+        if match.lastgroup != 'comment':
+            continue
+        start = match.start()
+        # Comments are visited in order, so the line pointer only moves forward
+        while lineno + 1 < num_lines and line_starts[lineno + 1] <= start:
+            lineno += 1
+        has_comment[lineno] = True
+
+    blank = [False] * num_lines
+    for i, line in enumerate(index.lines[:num_lines]):
+        stripped = line.strip()
+        if not stripped:
+            blank[i] = True
+        elif has_comment[i] and stripped.startswith('#'):
+            comment_only[i] = True
+
+    blank_prefix = [0] + list(accumulate(blank))
+    comment_prefix = [0] + list(accumulate(comment_only))
+    return blank_prefix, comment_prefix
+
+def compute_metrics(code, tree=None):
+    """
+    Compute code metrics in a single pass over the AST plus one comment scan.
+
+    Per function: LOC, source LOC, comment lines and ratio, cyclomatic complexity,
+    maximum nesting depth and Halstead counts. Complexity, nesting and Halstead counts
+    exclude nested functions, which are reported on their own.
+
+    Args:
+    - code (str): The source code to analyze.
+    - tree (ast.Module, optional): Already parsed tree of code.
+
+    Returns:
+    - dict: Module totals plus a "functions" list.
+
+    Raises:
+    - SyntaxError: When code does not parse.
+    """
+    if tree is None:
+        with span("parse"):
+            tree = ast.parse(code)
+    index = SourceIndex(code)
+    blank_prefix, comment_prefix = line_counts(code, index)
+
+    module = FunctionMetrics("<module>", "<module>", 1, len(index))
+    functions = []
+    num_classes = 0
+
+    # (node, owning function, nesting depth, qualname prefix, enclosing class name)
+    stack = [(child, module, 0, "", None) for child in reversed(tree.body)]
+    roles_of = NODE_ROLES.get
+    iter_fields = ast.iter_fields
+    AST = ast.AST
+    while stack:
+        node, owner, depth, prefix, class_name = stack.pop()
+        roles = roles_of(type(node), 0)
+
+        # Leaves: no children worth visiting (Name only holds its ctx)
+        if roles & NAME:
+            owner.operands.add(node.id)
+            owner.total_operands += 1
+            continue
+        if roles & CONSTANT:
+            owner.operands.add(repr(node.value))
+            owner.total_operands += 1
+            continue
+        if roles & OPERATOR:
+            owner.operators.add(type(node).__name__)
+            owner.total_operators += 1
+            if isinstance(node, (ast.operator, ast.unaryop, ast.boolop, ast.cmpop)):
+                continue
+
+        child_owner, child_depth, child_prefix, child_class = owner, depth, prefix, None
+        if roles & FUNCTION:
+            name = f"{class_name}.{node.name}" if class_name else node.name
+            child_owner = FunctionMetrics(name, f"{prefix}{node.name}", node.lineno, node.end_lineno)
+            functions.append(child_owner)
+            child_depth = 0
+            child_prefix = f"{prefix}{node.name}."
+        elif roles & CLASS:
+            num_classes += 1
+            child_prefix = f"{prefix}{node.name}."
+            child_class = node.name
+        elif roles & NESTING:
+            child_depth = depth + 1
+            if child_depth > owner.max_nesting:
+                owner.max_nesting = child_depth
+
+        if roles & DECISION:
+            owner.complexity += 1
+        elif roles & COMPREHENSION:
+            owner.complexity += 1 + len(node.ifs)
+        elif roles & BOOL_OP:
+            owner.complexity += len(node.values) - 1
+        elif roles & ATTRIBUTE:
+            owner.operators.add("Attribute")
+            owner.total_operators += 1
+            owner.operands.add(node.attr)
+            owner.total_operands += 1
+
+        for field, value in iter_fields(node):
+            if field == "orelse" and roles & NESTING and len(value) == 1 and type(value[0]) is ast.If:
+                # elif: same nesting level as its if
+                stack.append((value[0], child_owner, depth, child_prefix, child_class))
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, AST):
+                        stack.append((item, child_owner, child_depth, child_prefix, child_class))
+            elif isinstance(value, AST):
+                stack.append((value, child_owner, child_depth, child_prefix, child_class))
+
+    def lines_of(start, end):
+        total = end - start + 1
+        blank = blank_prefix[end] - blank_prefix[start - 1]
+        comments = comment_prefix[end] - comment_prefix[start - 1]
+        source = total - blank - comments
+        return {
+            "loc": total,
+            "sloc": source,
+            "blank_lines": blank,
+            "comment_lines": comments,
+            "comment_ratio": round(comments / (comments + source), 3) if comments + source else 0.0,
+        }
+
+    function_reports = []
+    for function in sorted(functions, key=lambda f: f.lineno):
+        report = {
+            "name": function.name,
+            "qualname": function.qualname,
+            "lineno": function.lineno,
+            "end_lineno": function.end_lineno,
+            "complexity": function.complexity,
+            "max_nesting": function.max_nesting,
+            "halstead": halstead(len(function.operators), len(function.operands),
+                                 function.total_operators, function.total_operands),
+        }
+        report.update(lines_of(function.lineno, function.end_lineno))
+        function_reports.append(report)
+
+    everything = [module] + functions
+    result = {
+        "num_functions": len(functions),
+        "num_classes": num_classes,
+        "num_lines": len(index),
+        "module_complexity": module.complexity,
+        "max_nesting": max([module.max_nesting] + [f.max_nesting for f in functions]),
+        "halstead": halstead(
+            len(set().union(*(f.operators for f in everything))),
+            len(set().union(*(f.operands for f in everything))),
+            sum(f.total_operators for f in everything),
+            sum(f.total_operands for f in everything),
+        ),
+        "functions": function_reports,
+    }
+    result.update(lines_of(1, len(index)))
+    return result
@@ -0,0 +1,151 @@
+import ast
+import bisect
+import os
+
+from cache import LRUCache, content_key
+from source_index import SourceIndex
+from utils import parse_block
+from instrumentation import span
+from store import result_store
+
+# Definition indexes keyed on the source hash, so cursor moves never re-parse
+definition_index_cache = LRUCache(
+    maxsize=int(os.environ.get("DEFINITION_INDEX_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("DEFINITION_INDEX_CACHE_TTL", 1800)),
+    store=result_store,
+    namespace="definition_index",
+    # Only the definitions are stored; the segments are rebuilt from them
+    encode=lambda index: index.definitions,
+    decode=lambda definitions: DefinitionIndex(definitions),
+)
+
+class DefinitionIndex:
+    """
+    Interval index over the FunctionDef/ClassDef line ranges of a module.
+
+    Definitions nest properly, so their ranges are flattened into sorted,
+    non-overlapping segments each owned by the innermost definition.
+    A line lookup is then a single binary search.
+    """
+
+    def __init__(self, definitions):
+        """
+        Args:
+        - definitions (list): Dicts with name, qualname, kind, lineno, end_lineno and parent
+          (index of the enclosing definition or None).
+        """
+        self.definitions = definitions
+        self.segment_starts = []
+        self.segment_owners = []
+
+        order = sorted(range(len(definitions)), key=lambda i: (definitions[i]["lineno"], -definitions[i]["end_lineno"]))
+        stack = []
+        for i in order:
+            while stack and definitions[stack[-1]]["end_lineno"] < definitions[i]["lineno"]:
+                closed = stack.pop()
+                self._add_segment(definitions[closed]["end_lineno"] + 1, stack[-1] if stack else None)
+            stack.append(i)
+            self._add_segment(definitions[i]["lineno"], i)
+
+        while stack:
+            closed = stack.pop()
+            self._add_segment(definitions[closed]["end_lineno"] + 1, stack[-1] if stack else None)
+
+    def _add_segment(self, start, owner):
+        if self.segment_starts and self.segment_starts[-1] == start:
+            self.segment_owners[-1] = owner
+        else:
+            self.segment_starts.append(start)
+            self.segment_owners.append(owner)
+
+    def lookup(self, line):
+        """
+        Return the chain of definitions containing line, outermost first (empty when none).
+        """
+        position = bisect.bisect_right(self.segment_starts, line) - 1
+        if position < 0:
+            return []
+
+        chain = []
+        owner = self.segment_owners[position]
+        while owner is not None:
+            definition = self.definitions[owner]
+            chain.append(definition)
+            owner = definition["parent"]
+        chain.reverse()
+        return chain
+
+# Nodes that can hold definitions (match_case only exists on Python 3.10+)
+STATEMENT_CONTAINERS = tuple(
+    getattr(ast, name) for name in ("stmt", "excepthandler", "match_case") if hasattr(ast, name)
+)
+
+def collect_definition_ranges(tree, definitions):
+    """
+    Append the FunctionDef/ClassDef ranges of a parsed tree to definitions.
+    Names follow detect_functions_from_code ("Class.method"), qualnames are pyflowchart field paths.
+    """
+    stack = [(child, None, "", None) for child in reversed(tree.body)]
+    while stack:
+        node, parent, prefix, parent_class = stack.pop()
+        if not isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            # Definitions only live in statement lists, so expressions are skipped
+            for child in reversed(list(ast.iter_child_nodes(node))):
+                if isinstance(child, STATEMENT_CONTAINERS):
+                    stack.append((child, parent, prefix, None))
+            continue
+
+        qualname = f"{prefix}{node.name}"
+        is_class = isinstance(node, ast.ClassDef)
+        if is_class:
+            kind, name = "class", node.name
+        elif parent_class is not None:
+            kind, name = "method", f"{parent_class}.{node.name}"
+        else:
+            kind, name = "function", node.name
+
+        definitions.append({
+            "name": name,
+            "qualname": qualname,
+            "kind": kind,
+            "lineno": node.lineno,
+            "end_lineno": node.end_lineno,
+            "parent": parent,
+        })
+        current = len(definitions) - 1
+        for child in reversed(node.body):
+            stack.append((child, current, f"{qualname}.", node.name if is_class else None))
+
+def build_definition_index(code):
+    """
+    Build a DefinitionIndex for code, recovering block by block when it does not parse.
+    """
+    definitions = []
+    try:
+        with span("parse"):
+            tree = ast.parse(code)
+        collect_definition_ranges(tree, definitions)
+    except SyntaxError:
+        index = SourceIndex(code)
+        for start, end in index.top_level_blocks():
+            tree = parse_block(index, start, end, [])
+            if tree is not None:
+                collect_definition_ranges(tree, definitions)
+    return DefinitionIndex(definitions)
+
+def source_hash(code):
+    return content_key("definitions", code)
+
+def definition_index_for(code):
+    """
+    Return the cached DefinitionIndex for code, building it on first use.
+
+    Returns:
+    - tuple: (source_hash, DefinitionIndex)
+    """
+    key = source_hash(code)
+    index = definition_index_cache.get(key)
+    if index is None:
+        index = build_definition_index(code)
+        definition_index_cache.set(key, index)
+    return key, index
@@ -0,0 +1,111 @@
+import json
+
+from instrumentation import span
+
+# Optional dependency of the binary graph format
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = "application/json"
+COMPACT_MIMETYPE = "application/vnd.codewizard.graph+json"
+MSGPACK_MIMETYPE = "application/vnd.codewizard.graph+msgpack"
+
+# ?format= value -> response mimetype, in the order used to break Accept ties
+GRAPH_FORMATS = {
+    "json": JSON_MIMETYPE,
+    "compact": COMPACT_MIMETYPE,
+    "msgpack": MSGPACK_MIMETYPE,
+}
+
+# Generic msgpack mimetypes clients commonly send
+MSGPACK_ALIASES = ("application/msgpack", "application/x-msgpack")
+
+COMPACT_VERSION = 2
+
+class FormatNotAcceptable(Exception):
+    """
+    Raised when the requested graph format cannot be produced. Answered with 406.
+    """
+    status_code = 406
+
+def negotiate_graph_format(requested, accept):
+    """
+    Pick the wire format of a graph response.
+
+    Args:
+    - requested (str): Value of the ?format= query flag, "" when absent. Takes precedence over accept.
+    - accept (werkzeug.datastructures.MIMEAccept): The request's Accept header. JSON is the default.
+
+    Returns:
+    - str: A key of GRAPH_FORMATS.
+
+    Raises:
+    - FormatNotAcceptable: Unknown format, or msgpack requested without the msgpack package.
+    """
+    if requested:
+        if requested not in GRAPH_FORMATS:
+            raise FormatNotAcceptable(f"Unsupported format '{requested}'. Supported formats: {', '.join(GRAPH_FORMATS)}.")
+        graph_format = requested
+    else:
+        # Clients that ask for nothing we offer still get plain JSON, as before
+        best = accept.best_match(list(GRAPH_FORMATS.values()) + list(MSGPACK_ALIASES), default=JSON_MIMETYPE)
+        graph_format = "msgpack" if best in MSGPACK_ALIASES else next(key for key, value in GRAPH_FORMATS.items() if value == best)
+
+    if graph_format == "msgpack" and msgpack is None:
+        raise FormatNotAcceptable("The msgpack format is not available on this server (msgpack is not installed)")
+    return graph_format
+
+def to_compact(graph):
+    """
+    Convert a generate_flowchart_from_code result to the columnar format: one array per
+    field, with edges pointing at nodes by array index instead of by id.
+    Node ids are only sent when they are not the implicit "1".."n" in array order.
+    Edge ids are dropped; they are "e<source id>-<target id>" ("c..." for call edges).
+    Most edges have no label, so labels are sent sparsely, keyed by edge index.
+
+    Returns:
+    - dict: {
+        "version": 2,
+        "nodes": {"label": [...], "x": [...], "y": [...], "id": [...] (only when not implicit)},
+        "edges": {"source": [<node index>, ...], "target": [...], "label": {"<edge index>": <label>, ...}},
+        "pretty_code": "..."
+      }
+    """
+    nodes = graph["nodes"]
+    edges = graph["edges"]
+    ids = [node["id"] for node in nodes]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    positions = [node["position"] for node in nodes]
+    compact_nodes = {
+        "label": [node["label"] for node in nodes],
+        "x": [position["x"] for position in positions],
+        "y": [position["y"] for position in positions],
+    }
+    if any(node_id != str(i) for i, node_id in enumerate(ids, start=1)):
+        compact_nodes["id"] = ids
+    return {
+        "version": COMPACT_VERSION,
+        "nodes": compact_nodes,
+        "edges": {
+            "source": [index[edge["source"]] for edge in edges],
+            "target": [index[edge["target"]] for edge in edges],
+            "label": {str(i): edge["label"] for i, edge in enumerate(edges) if edge.get("label") is not None},
+        },
+        "pretty_code": graph["pretty_code"],
+    }
+
+def encode_compact_graph(graph, graph_format):
+    """
+    Serialise a graph in the "compact" or "msgpack" format ("json" goes through jsonify).
+
+    Returns:
+    - tuple: (body, mimetype).
+    """
+    compact = to_compact(graph)
+    if graph_format == "compact":
+        with span("json"):
+            return json.dumps(compact, separators=(",", ":")), COMPACT_MIMETYPE
+    with span("msgpack"):
+        return msgpack.packb(compact, use_bin_type=True), MSGPACK_MIMETYPE
@@ -0,0 +1,116 @@
+import ast
+import os
+import re
+
+from cache import LRUCache, content_key
+from store import result_store
+from source_index import SourceIndex
+from utils import cached_flowchart, collect_definitions, flowchart_from_snippet, parse_block, remove_unexpected_indent
+
+# Per-definition results, keyed on the hash of each top-level block's source
+definition_cache = LRUCache(
+    maxsize=int(os.environ.get("DEFINITION_CACHE_SIZE", 20000)),
+    ttl=float(os.environ.get("DEFINITION_CACHE_TTL", 3600)),
+    store=result_store,
+    namespace="definition",
+    # The store holds JSON, which has no sets
+    encode=lambda block: dict(block, class_methods=sorted(block["class_methods"])),
+    decode=lambda block: dict(block, class_methods=set(block["class_methods"])),
+)
+
+DEFINITION_NAME_RE = re.compile(r'^(?:async\s+def|def|class)\s+(\w+)', re.MULTILINE)
+
+def analyze_block(block_code):
+    """
+    Collect functions and imports of a single top-level block, with positions relative to the block.
+
+    Returns:
+    - dict or None: {"functions", "imports", "class_methods"}, or None when the block does not parse.
+    """
+    try:
+        tree = ast.parse(block_code)
+    except (SyntaxError, ValueError):
+        return None
+
+    functions = {}
+    imports = []
+    class_methods = set()
+    collect_definitions(block_code, tree, SourceIndex(block_code), functions, imports, class_methods)
+    return {"functions": functions, "imports": imports, "class_methods": class_methods}
+
+def detect_functions_incremental(code):
+    """
+    Incremental variant of detect_functions_from_code.
+
+    Every top-level block (usually one FunctionDef/ClassDef) is hashed and its result kept in
+    definition_cache, so after an edit only the changed blocks are parsed again. What remains
+    per request is one line scan and hashing of the file.
+    Broken blocks are never cached; they go through the tolerant parser on every request.
+
+    Args:
+    - code (str): The source code to analyze.
+
+    Returns:
+    - dict: Same shape as detect_functions_from_code, plus "recomputed": <number of blocks parsed>.
+    """
+    index = SourceIndex(code)
+    functions = {}
+    imports = []
+    errors = []
+    class_methods = set()
+    recomputed = 0
+
+    for start, end in index.top_level_blocks():
+        block_code = index.line_span(start, end)
+        key = content_key("definition", block_code)
+        block = definition_cache.get(key)
+
+        if block is None:
+            recomputed += 1
+            block = analyze_block(block_code)
+            if block is not None:
+                definition_cache.set(key, block)
+
+        if block is None:
+            # Recover the broken block with error lines relative to the whole file
+            tree = parse_block(index, start, end, errors)
+            if tree is not None:
+                collect_definitions(code, tree, index, functions, imports, class_methods)
+            continue
+
+        # Same class-method de-duplication the tolerant parser applies across blocks
+        for name, func_code in block["functions"].items():
+            if "." in name or name not in class_methods:
+                functions[name] = func_code
+        imports.extend(block["imports"])
+        class_methods.update(block["class_methods"])
+
+    return {"functions": functions, "imports": imports, "errors": errors, "recomputed": recomputed}
+
+def find_definition_block(code, function_name):
+    """
+    Return the source of the top-level block defining the first part of a pyflowchart field path.
+    Later definitions win, as in pyflowchart. Returns None when no block matches.
+    """
+    top_level_name = function_name.split('.')[0]
+    index = SourceIndex(code)
+    for start, end in reversed(index.top_level_blocks()):
+        block_code = index.line_span(start, end)
+        match = DEFINITION_NAME_RE.search(block_code)
+        if match and match.group(1) == top_level_name:
+            return block_code
+    return None
+
+def flowchart_incremental(code, function_name, gate=None):
+    """
+    Incremental variant of flowchart_from_snippet.
+
+    The flowchart of a function only depends on its own definition, so the cache is keyed on
+    that definition's source: edits elsewhere in the file keep hitting the cache.
+    """
+    code = remove_unexpected_indent(code)
+    if function_name:
+        block_code = find_definition_block(code, function_name)
+        if block_code is not None:
+            return cached_flowchart(block_code, function_name, gate=gate)
+    return flowchart_from_snippet(code, function_name, gate=gate)
@@ -0,0 +1,218 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+# METRICS_ENABLED=0 turns every span into a shared no-op and leaves /metrics empty
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# Upper bounds (seconds) of the latency histogram buckets, +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+METRIC_PREFIX = "codewizard"
+
+# name -> (type, help, label names)
+METRICS = {
+    "requests_total": ("counter", "Requests served, by endpoint and status code.", ("endpoint", "status")),
+    "request_duration_seconds": ("histogram", "Time spent handling a request, by endpoint.", ("endpoint",)),
+    "stage_duration_seconds": ("histogram", "Time spent in one stage of a request, by endpoint and stage.", ("endpoint", "stage")),
+}
+
+# Endpoint (route rule) of the request being served by the current thread
+current_endpoint = ContextVar("current_endpoint", default=None)
+
+# Inside a sandbox worker spans are collected here and shipped back with the job result
+_collected = threading.local()
+
+NULL_SPAN = nullcontext()
+
+class Histogram:
+    """
+    Latency histogram over LATENCY_BUCKETS, made cumulative when exported.
+    """
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """
+    Thread-safe store of the counters and histograms in METRICS, keyed by label values.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Export every metric in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+        - str: One HELP/TYPE block per metric followed by its samples.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count)) for key, h in self._histograms.items())
+
+        lines = []
+        for name, (kind, help_text, label_names) in METRICS.items():
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in counters:
+                    if metric == name:
+                        lines.append(f"{full_name}{format_labels(label_names, labels)} {value}")
+                continue
+            for (metric, labels), (counts, total, count) in histograms:
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    bucket_labels = format_labels(label_names + ("le",), labels + (str(bound),))
+                    lines.append(f"{full_name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{full_name}_sum{format_labels(label_names, labels)} {total:.6f}")
+                lines.append(f"{full_name}_count{format_labels(label_names, labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values):
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)) + "}"
+
+registry = MetricsRegistry()
+
+class Span:
+    """
+    Times one named stage and records it against the current request's endpoint.
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+def span(stage):
+    """
+    Context manager timing the stage (e.g. "parse", "pyflowchart").
+    Returns a shared no-op when metrics are disabled.
+    """
+    if not METRICS_ENABLED:
+        return NULL_SPAN
+    return Span(stage)
+
+def record_stage(stage, seconds):
+    collected = getattr(_collected, "spans", None)
+    if collected is not None:
+        collected.append((stage, seconds))
+        return
+    endpoint = current_endpoint.get()
+    # Work done outside a request (CLI, benchmarks, warm-up) is not reported
+    if endpoint is not None:
+        registry.observe("stage_duration_seconds", (endpoint, stage), seconds)
+
+def record_stages(spans):
+    """
+    Record (stage, seconds) pairs collected in a sandbox worker against the current endpoint.
+    """
+    for stage, seconds in spans:
+        record_stage(stage, seconds)
+
+def call_with_spans(func, *args):
+    """
+    Run func(*args) collecting its spans instead of recording them, so a sandbox
+    worker can send them back to the process serving the request.
+
+    Returns:
+    - tuple: (result, [(stage, seconds), ...]).
+    """
+    _collected.spans = spans = []
+    try:
+        return func(*args), spans
+    finally:
+        _collected.spans = None
+
+def render_metrics():
+    return registry.render()
+
+def instrument_app(app):
+    """
+    Time every request of app per endpoint and JSON serialisation as the "json" stage.
+    Nothing is registered when metrics are disabled.
+    """
+    if not METRICS_ENABLED:
+        return app
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with span("json"):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_timer():
+        # The route rule keeps the label set bounded; unknown paths share one label
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        g.metrics_token = current_endpoint.set(endpoint)
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def stop_request_timer(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            endpoint = current_endpoint.get()
+            registry.observe("request_duration_seconds", (endpoint,), time.perf_counter() - start)
+            registry.inc("requests_total", (endpoint, str(response.status_code)))
+        return response
+
+    @app.teardown_request
+    def reset_endpoint(exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            current_endpoint.reset(token)
+
+    return app
@@ -0,0 +1,115 @@
+from collections import defaultdict, deque
+
+# Spacing used by the layered layout, in the same units as the grid layout
+LAYER_SPACING = 150
+NODE_SPACING = 300
+ORDERING_SWEEPS = 4
+
+LAYOUTS = ("grid", "layered")
+
+def assign_layers(node_ids, successors, predecessors):
+    """
+    Longest-path layering: every node sits one layer below its deepest predecessor.
+    Edges closing a cycle are ignored, so any graph gets a layering.
+
+    Returns:
+    - dict: node id -> layer index (0 for sources).
+    """
+    indegree = {node: len(predecessors[node]) for node in node_ids}
+    ready = deque(node for node in node_ids if indegree[node] == 0)
+    layer = {}
+    remaining = set(node_ids)
+
+    while remaining:
+        if not ready:
+            # Only cycles are left: start again from the first remaining node in input order
+            node = next(node for node in node_ids if node in remaining)
+            indegree[node] = 0
+            ready.append(node)
+        while ready:
+            node = ready.popleft()
+            if node not in remaining:
+                continue
+            remaining.discard(node)
+            depth = max((layer[p] + 1 for p in predecessors[node] if p in layer), default=0)
+            layer[node] = depth
+            for successor in successors[node]:
+                if successor in remaining:
+                    indegree[successor] -= 1
+                    if indegree[successor] <= 0:
+                        ready.append(successor)
+    return layer
+
+def order_layers(layers, successors, predecessors, sweeps=ORDERING_SWEEPS):
+    """
+    Reduce edge crossings with the barycenter heuristic: alternately sweep down and up,
+    sorting each layer by the mean position of its neighbours in the layer already fixed.
+    Nodes without such neighbours keep their current position.
+    """
+    position = {}
+    for nodes in layers:
+        for i, node in enumerate(nodes):
+            position[node] = i
+
+    for sweep in range(sweeps):
+        downward = sweep % 2 == 0
+        neighbours_of = predecessors if downward else successors
+        indices = range(1, len(layers)) if downward else range(len(layers) - 2, -1, -1)
+        for i in indices:
+            nodes = layers[i]
+
+            def barycenter(node):
+                neighbours = [position[n] for n in neighbours_of[node] if n in position]
+                return sum(neighbours) / len(neighbours) if neighbours else position[node]
+
+            # Sorting is stable, so ties keep the previous order
+            nodes.sort(key=barycenter)
+            for j, node in enumerate(nodes):
+                position[node] = j
+    return layers
+
+def layered_layout(nodes, edges, layer_spacing=LAYER_SPACING, node_spacing=NODE_SPACING):
+    """
+    Compute a top-down layered layout for a graph in the generate_flowchart_from_code format.
+
+    Args:
+    - nodes (list): Dicts with an "id".
+    - edges (list): Dicts with "source" and "target" ids; "call" edges are not laid out.
+
+    Returns:
+    - dict: node id -> {"x": ..., "y": ...}, each layer centred on x = 0.
+    """
+    node_ids = [node["id"] for node in nodes]
+    successors = defaultdict(list)
+    predecessors = defaultdict(list)
+    for edge in edges:
+        # Call edges jump across the control flow and would distort the layering
+        if edge["source"] != edge["target"] and edge.get("label") != "call":
+            successors[edge["source"]].append(edge["target"])
+            predecessors[edge["target"]].append(edge["source"])
+
+    layer = assign_layers(node_ids, successors, predecessors)
+    layers = [[] for _ in range(max(layer.values(), default=-1) + 1)]
+    for node in node_ids:
+        layers[layer[node]].append(node)
+    order_layers(layers, successors, predecessors)
+
+    positions = {}
+    for depth, layer_nodes in enumerate(layers):
+        offset = (len(layer_nodes) - 1) / 2
+        for i, node in enumerate(layer_nodes):
+            positions[node] = {"x": round((i - offset) * node_spacing), "y": depth * layer_spacing}
+    return positions
+
+def apply_layout(graph, layout):
+    """
+    Re-position the nodes of a generate_flowchart_from_code result in place.
+    "grid" keeps the positions assigned while the graph was built.
+    """
+    if layout == "layered":
+        positions = layered_layout(graph["nodes"], graph["edges"])
+        for node in graph["nodes"]:
+            node["position"] = positions[node["id"]]
+    elif layout != "grid":
+        raise ValueError(f"Unsupported layout '{layout}'. Supported layouts: {', '.join(LAYOUTS)}.")
+    return graph
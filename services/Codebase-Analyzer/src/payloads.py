@@ -0,0 +1,222 @@
+import gzip
+import io
+import json
+import os
+import zlib
+
+from flask import request
+from werkzeug.wrappers import Response
+
+from instrumentation import span
+
+# Largest request body accepted, measured after gzip decompression
+MAX_REQUEST_BODY = int(os.environ.get("MAX_REQUEST_BODY", 4 * 1024 * 1024))
+# Archive uploads are streamed rather than buffered, so they get a limit of their own
+MAX_ARCHIVE_BODY = int(os.environ.get("MAX_ARCHIVE_BODY", 256 * 1024 * 1024))
+
+# Routes whose body is read as a stream by the view: path -> limit
+STREAMING_ROUTES = {
+    "/analyze-archive": MAX_ARCHIVE_BODY,
+}
+
+BODY_READ_CHUNK = 64 * 1024
+
+# JSON responses (including application/*+json) at least this large are gzipped for clients that accept it
+GZIP_MIN_RESPONSE = int(os.environ.get("GZIP_MIN_RESPONSE", 4096))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+
+class PayloadError(Exception):
+    """
+    Request body that cannot be accepted. status_code is the HTTP status to answer with.
+    """
+    status_code = 400
+
+class PayloadTooLarge(PayloadError):
+    status_code = 413
+
+class UnsupportedEncoding(PayloadError):
+    status_code = 415
+
+class LimitedBody:
+    """
+    Read-only view of a request body that decompresses gzip on the fly and raises
+    PayloadTooLarge as soon as more than limit bytes come out, so a small compressed
+    body cannot expand into an unbounded one.
+    """
+
+    def __init__(self, stream, limit, gzipped=False, length=None):
+        """
+        Args:
+        - stream (file-like): The raw wsgi.input stream.
+        - limit (int): Maximum number of (decompressed) bytes.
+        - gzipped (bool): Whether the body is gzip encoded.
+        - length (int, optional): Raw bytes to read, None to read until the stream ends.
+        """
+        self.stream = stream
+        self.limit = limit
+        self.remaining = length
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        self.buffer = bytearray()
+        self.total = 0
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.buffer.clear()
+
+    def _read_raw(self):
+        size = BODY_READ_CHUNK
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+            if size <= 0:
+                return b""
+        data = self.stream.read(size)
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    def _fill(self):
+        raw = self._read_raw()
+        if not raw:
+            self.eof = True
+            if self.decompressor is not None and not self.decompressor.eof:
+                raise PayloadError("Invalid gzip body: unexpected end of data")
+            return
+        if self.decompressor is None:
+            data = raw
+        else:
+            try:
+                # Never inflate more than one byte past the limit
+                data = self.decompressor.decompress(raw, self.limit - self.total + 1)
+            except zlib.error as e:
+                raise PayloadError(f"Invalid gzip body: {str(e)}")
+            if self.decompressor.unconsumed_tail:
+                raise PayloadTooLarge(f"Request body exceeds {self.limit} bytes")
+        self.total += len(data)
+        if self.total > self.limit:
+            raise PayloadTooLarge(f"Request body exceeds {self.limit} bytes")
+        self.buffer += data
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        while not self.eof and b"\n" not in self.buffer and (size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return data
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+def error_response(e):
+    return Response(json.dumps({"error": str(e)}), status=e.status_code, mimetype="application/json")
+
+class RequestBodyLimit:
+    """
+    WSGI middleware enforcing body limits before the application sees the request.
+
+    A declared Content-Length over the limit is rejected at once, without reading the body.
+    Other bodies are read (and gunzipped when Content-Encoding is gzip) chunk by chunk,
+    failing as soon as the limit is crossed. Regular routes get the checked body buffered;
+    streaming routes get the limited stream itself.
+    """
+
+    def __init__(self, app, max_body=MAX_REQUEST_BODY, streaming_routes=None):
+        self.app = app
+        self.max_body = max_body
+        self.streaming_routes = STREAMING_ROUTES if streaming_routes is None else streaming_routes
+
+    def __call__(self, environ, start_response):
+        try:
+            self.prepare_body(environ)
+        except PayloadError as e:
+            return error_response(e)(environ, start_response)
+        return self.app(environ, start_response)
+
+    def prepare_body(self, environ):
+        path = environ.get("PATH_INFO", "").rstrip("/") or "/"
+        streaming = path in self.streaming_routes
+        limit = self.streaming_routes[path] if streaming else self.max_body
+
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding not in ("", "identity", "gzip"):
+            raise UnsupportedEncoding(f"Unsupported Content-Encoding '{encoding}'. Supported encodings: gzip.")
+        gzipped = encoding == "gzip"
+
+        length = environ.get("CONTENT_LENGTH", "")
+        chunked = environ.get("HTTP_TRANSFER_ENCODING", "").lower() == "chunked"
+        if length and not chunked:
+            try:
+                length = int(length)
+            except ValueError:
+                raise PayloadError("Invalid Content-Length header")
+            if length < 0:
+                raise PayloadError("Invalid Content-Length header")
+            if length > limit:
+                raise PayloadTooLarge(f"Request body of {length} bytes exceeds {limit} bytes")
+        else:
+            length = None
+            if not chunked and not environ.get("wsgi.input_terminated"):
+                return
+
+        body = LimitedBody(environ["wsgi.input"], limit, gzipped, length)
+        environ.pop("HTTP_CONTENT_ENCODING", None)
+        if streaming:
+            environ["wsgi.input"] = body
+            if gzipped or length is None:
+                # The decoded length is unknown until the stream ends
+                environ.pop("CONTENT_LENGTH", None)
+                environ["wsgi.input_terminated"] = True
+            return
+
+        data = body.read()
+        environ["wsgi.input"] = io.BytesIO(data)
+        environ["CONTENT_LENGTH"] = str(len(data))
+        environ.pop("HTTP_TRANSFER_ENCODING", None)
+        environ.pop("wsgi.input_terminated", None)
+
+def limit_request_bodies(app):
+    """
+    Enforce request body limits on app, reject malformed JSON bodies before any view runs
+    and gzip large JSON responses.
+    """
+    app.wsgi_app = RequestBodyLimit(app.wsgi_app)
+
+    @app.before_request
+    def reject_invalid_json():
+        if request.is_json and request.content_length:
+            # Parsed once here; views reuse the cached result through request.json
+            if not isinstance(request.get_json(silent=True), dict):
+                return error_response(PayloadError("Request body must be a JSON object"))
+
+    @app.after_request
+    def compress_response(response):
+        if (not response.is_json or response.is_streamed or response.direct_passthrough
+                or "Content-Encoding" in response.headers or not request.accept_encodings["gzip"]):
+            return response
+        data = response.get_data()
+        if len(data) < GZIP_MIN_RESPONSE:
+            return response
+        with span("gzip"):
+            response.set_data(gzip.compress(data, GZIP_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+        return response
+
+    return app
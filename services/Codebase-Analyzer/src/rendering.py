@@ -0,0 +1,31 @@
+import base64
+import os
+
+from cache import LRUCache
+from store import result_store
+
+# Rendered PNG bytes keyed on the content hash of (pseudocode, font size)
+render_cache = LRUCache(
+    maxsize=int(os.environ.get("RENDER_CACHE_SIZE", 64)),
+    ttl=float(os.environ.get("RENDER_CACHE_TTL", 3600)),
+    store=result_store,
+    namespace="render",
+    encode=lambda png: base64.b64encode(png).decode("ascii"),
+    decode=base64.b64decode,
+)
+
+def render_png(text, font_size=20):
+    """
+    Render pseudocode text to PNG bytes with Converter.render_png.
+    Converter (PIL, click and the drawer) is imported on first use (see warmup.py).
+
+    Args:
+    - text (str): IGCSE pseudocode.
+    - font_size (int): Font size, which scales the whole chart.
+
+    Returns:
+    - bytes: The encoded PNG image.
+    """
+    from Converter import render_png as convert
+
+    return convert(text, font_size)
@@ -0,0 +1,226 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+
+from instrumentation import METRICS_ENABLED, call_with_spans, record_stages, span
+
+try:
+    import resource
+except ImportError:  # resource limits are only available on Unix
+    resource = None
+
+# Pool configuration, SANDBOX_WORKERS=0 runs jobs inline in the request thread
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", os.cpu_count() or 1))
+SANDBOX_TIMEOUT = float(os.environ.get("SANDBOX_TIMEOUT", 10))
+SANDBOX_MEMORY_LIMIT = int(os.environ.get("SANDBOX_MEMORY_LIMIT", 512 * 1024 * 1024))
+SANDBOX_QUEUE_TIMEOUT = float(os.environ.get("SANDBOX_QUEUE_TIMEOUT", 5))
+
+class SandboxError(Exception):
+    """
+    Base class for jobs the sandbox could not complete. status_code is the HTTP status to answer with.
+    """
+    status_code = 500
+
+class JobTimeout(SandboxError):
+    status_code = 504
+
+class JobMemoryExceeded(SandboxError):
+    status_code = 422
+
+class WorkerCrashed(SandboxError):
+    status_code = 500
+
+class PoolBusy(SandboxError):
+    status_code = 503
+
+# True inside a pool worker, where jobs are already sandboxed and run inline
+_in_worker = False
+
+def _worker_main(conn, memory_limit):
+    """
+    Worker loop: receive (func, args, cpu_seconds), run it and send back (status, payload).
+    """
+    global _in_worker
+    _in_worker = True
+    # The parent handles Ctrl+C; workers are stopped through their pipe or a signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if resource is not None and memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    while True:
+        try:
+            func, args, cpu_seconds = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        if resource is not None and cpu_seconds:
+            # RLIMIT_CPU counts the whole process lifetime, so the budget is added to what was used
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+            hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+        try:
+            reply = ("ok", func(*args))
+        except MemoryError:
+            reply = ("memory", None)
+        except Exception as e:
+            reply = ("raise", e)
+
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Result or exception could not be pickled
+            conn.send(("raise", RuntimeError(str(e))))
+
+        if reply[0] == "memory":
+            # The heap may be left fragmented; let the parent start a fresh worker
+            return
+
+class SandboxWorker:
+    """
+    One pre-forked worker process and the parent's end of its pipe.
+    """
+
+    def __init__(self, context, memory_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+class SandboxPool:
+    """
+    Pool of pre-forked worker processes running untrusted jobs under a wall-clock
+    timeout, a CPU-time budget and an address-space limit. Workers that time out,
+    run out of memory or crash are killed and replaced, so the pool keeps serving.
+    """
+
+    def __init__(self, size=SANDBOX_WORKERS, timeout=SANDBOX_TIMEOUT, memory_limit=SANDBOX_MEMORY_LIMIT,
+                 queue_timeout=SANDBOX_QUEUE_TIMEOUT):
+        """
+        Args:
+        - size (int): Number of worker processes.
+        - timeout (float): Wall-clock seconds a job may run; also its CPU budget.
+        - memory_limit (int): Address-space limit per worker in bytes (0 for none).
+        - queue_timeout (float): Seconds to wait for an idle worker before rejecting a job (None waits until one is free).
+        """
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.queue_timeout = queue_timeout
+        self.owner_pid = os.getpid()
+        self._context = multiprocessing.get_context()
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        worker = SandboxWorker(self._context, self.memory_limit)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop()
+        self._idle.put(self._spawn())
+
+    def run(self, func, *args):
+        """
+        Run func(*args) in a worker and return its result.
+        Exceptions raised by func are re-raised here.
+
+        Raises:
+        - PoolBusy: No worker became idle within queue_timeout.
+        - JobTimeout: The job ran past its wall-clock or CPU budget.
+        - JobMemoryExceeded: The job hit the memory limit.
+        - WorkerCrashed: The worker died for another reason.
+        """
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise PoolBusy("All analysis workers are busy, please retry later")
+
+        try:
+            worker.conn.send((func, args, self.timeout))
+            if not worker.conn.poll(self.timeout):
+                self._replace(worker)
+                raise JobTimeout(f"Processing took longer than {self.timeout:g} seconds")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(1)
+            exitcode = worker.process.exitcode
+            self._replace(worker)
+            if exitcode == -signal.SIGXCPU:
+                raise JobTimeout(f"Processing used more than {self.timeout:g} seconds of CPU")
+            raise WorkerCrashed(f"Analysis worker crashed (exit code {exitcode})")
+
+        if status == "memory":
+            self._replace(worker)
+            raise JobMemoryExceeded("Processing exceeded the memory limit")
+
+        self._idle.put(worker)
+        if status == "raise":
+            raise payload
+        return payload
+
+    def close(self):
+        # A forked child inherits the pool object but not the workers, which belong to the owner
+        if os.getpid() != self.owner_pid:
+            return
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_sandbox():
+    """
+    Return this process's SandboxPool, forking its workers on first use.
+    Every serving process gets its own pool, including server workers started by
+    multiprocessing (uvicorn --workers) or forked from a process that already had one.
+    Returns None when SANDBOX_WORKERS is 0 or inside a pool worker (a sandbox or
+    archive worker), where jobs simply run inline.
+    """
+    global _pool
+    if SANDBOX_WORKERS <= 0 or _in_worker:
+        return None
+    pool = _pool
+    if pool is not None and pool.owner_pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.owner_pid != os.getpid():
+            _pool = SandboxPool()
+            atexit.register(_pool.close)
+    return _pool
+
+def run_job(func, *args):
+    """
+    Run func(*args) in the sandbox pool when one is available, otherwise inline.
+    """
+    pool = get_sandbox()
+    if pool is None:
+        return func(*args)
+    if not METRICS_ENABLED:
+        return pool.run(func, *args)
+    # Spans recorded in the worker travel back with the result; "sandbox" covers the queue and IPC too
+    with span("sandbox"):
+        result, spans = pool.run(call_with_spans, func, *args)
+    record_stages(spans)
+    return result
@@ -0,0 +1,152 @@
+import os
+import threading
+from functools import wraps
+
+from sandbox import SANDBOX_WORKERS
+
+# "threaded" runs the Flask server, "asgi" runs uvicorn with the WSGI app in a thread pool
+SERVE_MODE = os.environ.get("SERVE_MODE", "threaded").lower()
+SERVING_THREADS = int(os.environ.get("SERVING_THREADS", 32))
+
+# Per-endpoint limits for the heavy routes; requests beyond running + waiting are shed with a 503
+OFFLOAD_CONCURRENCY = int(os.environ.get("OFFLOAD_CONCURRENCY", max(SANDBOX_WORKERS, 1)))
+OFFLOAD_QUEUE_SIZE = int(os.environ.get("OFFLOAD_QUEUE_SIZE", 2 * max(SANDBOX_WORKERS, 1)))
+OFFLOAD_QUEUE_TIMEOUT = float(os.environ.get("OFFLOAD_QUEUE_TIMEOUT", 5))
+RETRY_AFTER = int(os.environ.get("OFFLOAD_RETRY_AFTER", 1))
+
+class Overloaded(Exception):
+    """
+    Raised when an endpoint queue is full. Answered with 503 and a Retry-After header.
+    """
+    status_code = 503
+
+    def __init__(self, message, retry_after=RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class EndpointGate:
+    """
+    Bounded admission for one endpoint: at most max_concurrent requests run and at most
+    max_queued wait for a slot. Anything beyond that is rejected at once, so slow jobs
+    never pile up on the serving threads that cheap requests need.
+    """
+
+    def __init__(self, name, max_concurrent=OFFLOAD_CONCURRENCY, max_queued=OFFLOAD_QUEUE_SIZE,
+                 queue_timeout=OFFLOAD_QUEUE_TIMEOUT):
+        """
+        Args:
+        - name (str): Endpoint name, used in messages and stats.
+        - max_concurrent (int): Requests allowed to run at the same time.
+        - max_queued (int): Requests allowed to wait for a running slot.
+        - queue_timeout (float): Seconds a queued request waits before it is shed.
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queued:
+                    self.rejected += 1
+                    raise Overloaded(f"Too many pending '{self.name}' requests, please retry later")
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self.active < self.max_concurrent, self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected += 1
+                    raise Overloaded(f"Timed out waiting for a '{self.name}' slot, please retry later")
+            self.active += 1
+            self.admitted += 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self.active,
+                "waiting": self.waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queued": self.max_queued,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+gates = {}
+_gates_lock = threading.Lock()
+
+def get_gate(name):
+    """
+    Return the EndpointGate for an endpoint, creating it on first use.
+    """
+    with _gates_lock:
+        if name not in gates:
+            gates[name] = EndpointGate(name)
+        return gates[name]
+
+def gated(name):
+    """
+    Decorator admitting a view through the EndpointGate of name.
+    Overloaded propagates to the app's error handler.
+    """
+    gate = get_gate(name)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            gate.acquire()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                gate.release()
+        return wrapper
+    return decorator
+
+def gate_stats():
+    with _gates_lock:
+        return {name: gate.stats() for name, gate in gates.items()}
+
+def create_asgi_app(wsgi_app, threads=SERVING_THREADS):
+    """
+    Wrap a WSGI app for an ASGI server. Each request runs in a pool of threads,
+    so heavy endpoints (bounded by their gates) leave threads free for cheap ones.
+    """
+    # Optional dependency of the ASGI serving mode, only imported when it is used
+    try:
+        from a2wsgi import WSGIMiddleware
+    except ImportError:
+        raise RuntimeError("SERVE_MODE=asgi requires the a2wsgi package")
+    return WSGIMiddleware(wsgi_app, workers=threads)
+
+def serve(app, host, port):
+    """
+    Start the app in the configured SERVE_MODE.
+    """
+    if SERVE_MODE == "asgi":
+        try:
+            import uvicorn
+            application = create_asgi_app(app)
+        except (ImportError, RuntimeError):
+            print("SERVE_MODE=asgi requires uvicorn and a2wsgi, falling back to the threaded Flask server")
+        else:
+            uvicorn.run(application, host=host, port=port)
+            return
+    app.run(host=host, port=port, threaded=True)
@@ -0,0 +1,172 @@
+import re
+
+# Same line breaks the Python tokenizer uses, so line numbers match ast's lineno
+LINE_BREAK_RE = re.compile(r'\r\n|\r|\n')
+
+# Tokens that decide whether the next line can start a new top-level statement
+NESTING_TOKEN_RE = re.compile(
+    r'(?P<escape>\\(?:\r\n|.))'
+    r'|(?P<triple>"""|\'\'\')'
+    r'|(?P<quote>["\'])'
+    r'|(?P<comment>#[^\r\n]*)'
+    r'|(?P<open>[\[({])'
+    r'|(?P<close>[\])}])'
+    r'|(?P<newline>\r\n|\r|\n)',
+    re.DOTALL,
+)
+
+# Top-level lines that continue the previous compound statement
+CONTINUATION_RE = re.compile(r'(else|elif|except|finally)\b')
+
+# Column-0 lines that start a statement even inside an unclosed bracket,
+# so one bad "def f(:" does not swallow the rest of the file
+DEFINITION_START_RE = re.compile(r'(?:async\s+def|def|class|import|from)\b|@')
+
+class SourceIndex:
+    """
+    Line-offset index over a source string, built once per request so that
+    slicing out functions, imports and error lines does not re-split the file.
+    """
+
+    def __init__(self, code):
+        """
+        Args:
+        - code (str): The full source code.
+        """
+        self.code = code
+        self.line_starts = [0]
+        self.lines = []
+
+        position = 0
+        for match in LINE_BREAK_RE.finditer(code):
+            self.lines.append(code[position:match.start()])
+            position = match.end()
+            self.line_starts.append(position)
+        self.lines.append(code[position:])
+
+    def __len__(self):
+        # A final line break ends the last line rather than starting an empty one
+        return len(self.lines) - (self.lines[-1] == "")
+
+    def line(self, lineno):
+        """
+        Return the text of a 1-based line, without its line break.
+        """
+        return self.lines[lineno - 1]
+
+    def line_span(self, start_lineno, end_lineno):
+        """
+        Return the full lines start_lineno..end_lineno (1-based, inclusive) joined with "\\n".
+        """
+        return "\n".join(self.lines[start_lineno - 1:end_lineno])
+
+    def node_lines(self, node):
+        """
+        Return the full lines covered by an AST node (from lineno to end_lineno).
+        """
+        end_lineno = getattr(node, 'end_lineno', None) or node.lineno
+        return self.line_span(node.lineno, end_lineno)
+
+    def offset(self, lineno, col_offset):
+        """
+        Convert an ast (lineno, col_offset) pair into a character offset in code.
+        ast column offsets count UTF-8 bytes, so non-ASCII lines are re-measured.
+        """
+        line = self.lines[lineno - 1]
+        if not line.isascii():
+            col_offset = len(line.encode('utf-8')[:col_offset].decode('utf-8', errors='ignore'))
+        return self.line_starts[lineno - 1] + col_offset
+
+    def segment(self, node):
+        """
+        Return the exact source of an AST node, honouring col_offset/end_lineno/end_col_offset.
+        Falls back to the node's full lines when end positions are not available.
+        """
+        end_lineno = getattr(node, 'end_lineno', None)
+        end_col_offset = getattr(node, 'end_col_offset', None)
+        if end_lineno is None or end_col_offset is None:
+            return self.node_lines(node)
+
+        start = self.offset(node.lineno, node.col_offset)
+        end = self.offset(end_lineno, end_col_offset)
+        return self.code[start:end]
+
+    def top_level_blocks(self):
+        """
+        Split the source into top-level statement blocks without parsing it.
+
+        A block starts at a column-0 line that is outside any bracket, string or
+        backslash continuation, and that does not continue the previous statement
+        (else/elif/except/finally, or a def/class following its decorators).
+        Broken code still splits cleanly, so each block can be parsed on its own.
+
+        Returns:
+        - list: (start_lineno, end_lineno) pairs, 1-based and inclusive, in source order.
+        """
+        starts = self._statement_starts()
+        blocks = []
+        block_start = None
+        after_decorator = False
+
+        for lineno, line in enumerate(self.lines, start=1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+
+            opens_block = (
+                lineno in starts
+                and not line[0].isspace()
+                and not after_decorator
+                and not CONTINUATION_RE.match(line)
+            )
+            if opens_block:
+                if block_start is not None:
+                    blocks.append((block_start, lineno - 1))
+                block_start = lineno
+            elif block_start is None:
+                block_start = lineno
+
+            if lineno in starts and not line[0].isspace():
+                after_decorator = line.startswith('@')
+
+        if block_start is not None:
+            blocks.append((block_start, len(self)))
+        return blocks
+
+    def _statement_starts(self):
+        """
+        Return the set of line numbers that begin outside brackets, strings and continuations.
+        """
+        starts = {1}
+        lineno = 1
+        depth = 0
+        quote = None
+
+        for match in NESTING_TOKEN_RE.finditer(self.code):
+            kind = match.lastgroup
+            token = match.group()
+
+            if kind == 'newline':
+                lineno += 1
+                if quote is not None and len(quote) == 1:
+                    # Unterminated single-quoted string ends at the line break
+                    quote = None
+                if quote is None and depth > 0 and DEFINITION_START_RE.match(self.code, match.end()):
+                    depth = 0
+                if quote is None and depth == 0:
+                    starts.add(lineno)
+            elif kind == 'escape':
+                # Backslash continuations and escaped line breaks hide the next line start
+                if token[1:] in ('\r\n', '\r', '\n'):
+                    lineno += 1
+            elif quote is not None:
+                if token == quote:
+                    quote = None
+            elif kind in ('triple', 'quote'):
+                quote = token
+            elif kind == 'open':
+                depth += 1
+            elif kind == 'close':
+                depth = max(depth - 1, 0)
+
+        return starts
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+from functools import lru_cache
+
+def default_store_path():
+    """
+    Per-user location of the store: $XDG_CACHE_HOME/codewizard, falling back to ~/.cache/codewizard.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "codewizard", "results.sqlite3")
+
+# Shared on-disk results behind the in-process LRU caches. RESULT_STORE_PATH="" disables the store.
+RESULT_STORE_PATH = os.environ.get("RESULT_STORE_PATH", default_store_path())
+RESULT_STORE_MAX_BYTES = int(os.environ.get("RESULT_STORE_MAX_BYTES", 256 * 1024 * 1024))
+RESULT_STORE_BUSY_TIMEOUT = float(os.environ.get("RESULT_STORE_BUSY_TIMEOUT", 5))
+
+# Eviction trims the store to this fraction of its limit, so it does not run on every write
+EVICTION_LOW_WATER = 0.9
+# Writes between two size checks, per process
+EVICTION_CHECK_INTERVAL = 32
+# Access times are only refreshed when older than this, so most reads stay read-only
+ACCESS_RESOLUTION = 60
+
+# Bump when the table layout changes; a database with another version is emptied and recreated
+SCHEMA_VERSION = 2
+# Distributions whose output ends up in stored results
+BACKEND_DISTRIBUTIONS = ("astor", "pyflowchart", "python-code-analyzer", "pillow")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key, version)
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+class UnsafeStoreError(Exception):
+    """
+    The store file or its directory can be written by another user.
+    """
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Version component of every stored key: the schema version plus a fingerprint of this
+    service's source and of the backends that produce the results, so entries written by
+    another build are never read back.
+
+    Returns:
+    - str: "<schema version>-<hex digest>".
+    """
+    from importlib import metadata
+
+    digest = hashlib.sha256()
+    src = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(src)):
+        if name.endswith(".py"):
+            with open(os.path.join(src, name), "rb") as source:
+                digest.update(name.encode("utf-8"))
+                digest.update(source.read())
+    for name in BACKEND_DISTRIBUTIONS:
+        try:
+            digest.update(f"{name}=={metadata.version(name)}".encode("utf-8"))
+        except metadata.PackageNotFoundError:
+            digest.update(f"{name} missing".encode("utf-8"))
+    return f"{SCHEMA_VERSION}-{digest.hexdigest()[:16]}"
+
+def check_private(path, mode):
+    """
+    Raise UnsafeStoreError unless path belongs to the current user and is not writable by others.
+    """
+    info = os.stat(path)
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise UnsafeStoreError(f"{path} is owned by uid {info.st_uid}, not by the current user")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise UnsafeStoreError(f"{path} is writable by other users (mode {oct(stat.S_IMODE(info.st_mode))}, expected {oct(mode)})")
+
+def prepare_store_path(path):
+    """
+    Create the store's directory (0700) and file (0600) when missing, and refuse to use
+    either when another user owns them or can write to them.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # A shared sticky directory such as /tmp is fine: nobody else can replace our file in it
+    if not os.stat(directory).st_mode & stat.S_ISVTX:
+        check_private(directory, 0o700)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600))
+    check_private(path, 0o600)
+
+class ResultStore:
+    """
+    Size-bounded result store on SQLite, shared by every process on the host.
+
+    The database runs in WAL mode, so readers never block the single writer and any number of
+    processes can use it at once; a busy database is waited on for busy_timeout seconds.
+    Entries are keyed by (namespace, key, version), where key is a content hash of the source and
+    parameters and version is code_version(). Values are stored as JSON, never pickled, so a
+    tampered database cannot run code; the file is private to the user running the service.
+    When the stored values outgrow max_bytes, the least recently read are deleted.
+    Store failures never fail a request: they are reported and treated as misses.
+    """
+
+    def __init__(self, path, max_bytes=RESULT_STORE_MAX_BYTES, busy_timeout=RESULT_STORE_BUSY_TIMEOUT):
+        """
+        Args:
+        - path (str): SQLite database file, created on first use with mode 0600.
+        - max_bytes (int): Upper bound of the summed size of the stored values.
+        - busy_timeout (float): Seconds to wait for a lock held by another process.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # One connection per thread; a forked worker opens its own instead of sharing the parent's
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            prepare_store_path(self.path)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate(conn)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _migrate(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS results")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def get(self, namespace, key, ttl=None):
+        """
+        Return the value stored under (namespace, key) by this code version, or None when
+        missing, older than ttl seconds or unreadable.
+        """
+        try:
+            version = code_version()
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created, accessed FROM results WHERE namespace = ? AND key = ? AND version = ?",
+                (namespace, key, version),
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            value, created, accessed = row
+            now = time.time()
+            if ttl and created + ttl <= now:
+                conn.execute("DELETE FROM results WHERE namespace = ? AND key = ? AND version = ?", (namespace, key, version))
+                self._count("misses")
+                return None
+            if now - accessed > ACCESS_RESOLUTION:
+                conn.execute("UPDATE results SET accessed = ? WHERE namespace = ? AND key = ? AND version = ?", (now, namespace, key, version))
+            result = json.loads(value)
+        except (sqlite3.Error, OSError, UnsafeStoreError, ValueError) as e:
+            print(f"Error reading result store: {str(e)}")
+            self._count("errors")
+            return None
+        self._count("hits")
+        return result
+
+    def set(self, namespace, key, value):
+        """
+        Store value under (namespace, key), replacing any previous value.
+        value must be JSON serializable; LRUCache's encode hook converts other types.
+        """
+        try:
+            data = json.dumps(value, separators=(",", ":"))
+            if len(data) > self.max_bytes:
+                return
+            now = time.time()
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (namespace, key, version, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, key, code_version(), data, len(data), now, now),
+            )
+            with self._lock:
+                self.writes += 1
+                check_size = self.writes % EVICTION_CHECK_INTERVAL == 0
+            if check_size:
+                self.evict()
+        except (sqlite3.Error, OSError, UnsafeStoreError, TypeError, ValueError) as e:
+            print(f"Error writing result store: {str(e)}")
+            self._count("errors")
+
+    def evict(self):
+        """
+        Delete the least recently read entries once the stored values exceed max_bytes,
+        down to EVICTION_LOW_WATER of the limit.
+
+        Returns:
+        - int: Number of entries deleted.
+        """
+        conn = self._connection()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        excess = total - int(self.max_bytes * EVICTION_LOW_WATER)
+        victims = []
+        freed = 0
+        for namespace, key, version, size in conn.execute("SELECT namespace, key, version, size FROM results ORDER BY accessed"):
+            victims.append((namespace, key, version))
+            freed += size
+            if freed >= excess:
+                break
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM results WHERE namespace = ? AND key = ? AND version = ?", victims)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("evictions", len(victims))
+        return len(victims)
+
+    def clear(self, namespace=None):
+        try:
+            if namespace is None:
+                self._connection().execute("DELETE FROM results")
+            else:
+                self._connection().execute("DELETE FROM results WHERE namespace = ?", (namespace,))
+        except (sqlite3.Error, OSError, UnsafeStoreError) as e:
+            print(f"Error clearing result store: {str(e)}")
+
+    def stats(self):
+        """
+        Return this process's counters along with the shared entry count and size.
+        """
+        try:
+            entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        except (sqlite3.Error, OSError, UnsafeStoreError):
+            entries, size = None, None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "version": code_version(),
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+# Shared by every cache of this process, None when disabled
+result_store = ResultStore(RESULT_STORE_PATH) if RESULT_STORE_PATH else None
@@ -0,0 +1,151 @@
+'''
+output backends for Converter.drawer
+a surface hands drawer an ImageDraw-like object (line, ellipse, rectangle, text)
+and turns what was drawn into the final output
+'''
+
+import math
+import struct
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image, ImageDraw
+
+class RasterSurface:
+    # The whole chart as one RGB image in memory
+
+    def begin(self,width,height):
+        self.img = Image.new('RGB', (width, height), color = 'white')
+        return ImageDraw.Draw(self.img)
+
+    def finish(self):
+        return self.img
+
+def number(value):
+    return f"{value:.2f}".rstrip('0').rstrip('.')
+
+class SvgSurface:
+    # Writes every primitive to a text stream as an SVG element as soon as it is drawn
+
+    def __init__(self,stream):
+        self.stream = stream
+
+    def begin(self,width,height):
+        self.stream.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">\n')
+        self.stream.write(f'<rect width="{width}" height="{height}" fill="white"/>\n')
+        return self
+
+    def finish(self):
+        self.stream.write('</svg>\n')
+        return self.stream
+
+    def line(self,xy,fill=None,width=1):
+        points = " ".join(f"{number(x)},{number(y)}" for x,y in xy)
+        self.stream.write(f'<polyline points="{points}" fill="none" stroke="{fill or "black"}" stroke-width="{width}"/>\n')
+
+    def rectangle(self,xy,fill=None,outline=None):
+        (x0,y0),(x1,y1) = xy
+        self.stream.write(f'<rect x="{number(x0)}" y="{number(y0)}" width="{number(x1-x0)}" height="{number(y1-y0)}" '
+                          f'fill="{fill or "none"}" stroke="{outline or "none"}"/>\n')
+
+    def ellipse(self,xy,fill=None,outline=None):
+        (x0,y0),(x1,y1) = xy
+        self.stream.write(f'<ellipse cx="{number((x0+x1)/2)}" cy="{number((y0+y1)/2)}" rx="{number((x1-x0)/2)}" ry="{number((y1-y0)/2)}" '
+                          f'fill="{fill or "none"}" stroke="{outline or "none"}"/>\n')
+
+    def text(self,xy,text,fill=None,font=None):
+        x,y = xy
+        family = font.getname()[0] if font is not None else "sans-serif"
+        size = font.size if font is not None else 10
+        self.stream.write(f'<text x="{number(x)}" y="{number(y)}" font-family={quoteattr(family)} font-size="{size}" '
+                          f'fill="{fill or "black"}" dominant-baseline="text-before-edge">{escape(text)}</text>\n')
+
+class Recorder:
+    # Sorts the primitives drawer emits into bands of tile_height rows as they arrive,
+    # so each band later replays only the primitives that intersect it
+
+    def __init__(self,tile_height,tile_count):
+        self.tile_height = tile_height
+        self.tiles = [[] for _ in range(tile_count)]
+        self.text_reach = 0 # how far text may reach above the tile it ends in
+
+    def record(self,method,xy,top,bottom,*args,**kwargs):
+        operation = (method,xy,args,kwargs)
+        first = max(int(top) // self.tile_height, 0)
+        last = min(int(bottom) // self.tile_height, len(self.tiles) - 1)
+        for tile in range(first, last + 1):
+            self.tiles[tile].append(operation)
+
+    def line(self,xy,fill=None,width=1):
+        ys = [y for _,y in xy]
+        self.record('line',xy,min(ys)-width,max(ys)+width,fill=fill,width=width)
+
+    def rectangle(self,xy,fill=None,outline=None):
+        self.record('rectangle',xy,xy[0][1]-1,xy[1][1]+1,fill=fill,outline=outline)
+
+    def ellipse(self,xy,fill=None,outline=None):
+        self.record('ellipse',xy,xy[0][1]-1,xy[1][1]+1,fill=fill,outline=outline)
+
+    def text(self,xy,text,fill=None,font=None):
+        # Glyphs stay well within twice the font size below the anchor
+        size = font.size if font is not None else 10
+        self.text_reach = max(self.text_reach, 2*size)
+        self.record('text',[xy],xy[1]-size,xy[1]+2*size,text,fill=fill,font=font)
+
+def png_chunk(stream,kind,data):
+    stream.write(struct.pack('>I', len(data)))
+    stream.write(kind + data)
+    stream.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+class TiledPngSurface:
+    # Renders the chart as horizontal tiles of tile_height rows, one at a time, and streams
+    # them into a single PNG. Only one tile of pixels is ever held in memory.
+
+    def __init__(self,stream,tile_height=1024):
+        self.stream = stream
+        self.tile_height = tile_height
+
+    def begin(self,width,height):
+        self.width = width
+        self.height = height
+        self.recorder = Recorder(self.tile_height, (height + self.tile_height - 1) // self.tile_height)
+        return self.recorder
+
+    def finish(self):
+        tiles = self.recorder.tiles
+        self.stream.write(b'\x89PNG\r\n\x1a\n')
+        png_chunk(self.stream, b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0))
+        compressor = zlib.compressobj()
+        row_bytes = self.width * 3
+
+        # Every tile is drawn with a margin above it, so text crossing the top edge keeps a positive
+        # anchor; Pillow renders the fraction of a negative anchor differently
+        margin = int(math.ceil(self.recorder.text_reach))
+
+        for tile in range(len(tiles)):
+            # A band's primitives are dropped once it is drawn
+            operations,tiles[tile] = tiles[tile],None
+            offset = tile * self.tile_height - margin
+            height = min(self.tile_height, self.height - offset - margin)
+            img = Image.new('RGB', (self.width, height + margin), color = 'white')
+            draw = ImageDraw.Draw(img)
+
+            # Shapes are snapped the way the full image truncates its (positive) coordinates,
+            # since truncating negative coordinates would round the other way
+            for method,xy,args,kwargs in operations:
+                if method == 'text':
+                    draw.text((xy[0][0], xy[0][1] - offset), *args, **kwargs)
+                else:
+                    getattr(draw, method)([(x, math.floor(y) - offset) for x,y in xy], **kwargs)
+
+            pixels = img.tobytes()[margin*row_bytes:]
+            del draw,img
+            # Filter type 0 (none) in front of every scanline
+            scanlines = b''.join(b'\x00' + pixels[row*row_bytes:(row+1)*row_bytes] for row in range(height))
+            data = compressor.compress(scanlines)
+            if data:
+                png_chunk(self.stream, b'IDAT', data)
+
+        png_chunk(self.stream, b'IDAT', compressor.flush())
+        png_chunk(self.stream, b'IEND', b'')
+        return self.stream
@@ -1,38 +1,12 @@
-class newNode: 
-    def __init__(self, data): 
-        self.data = data  
-        self.left = self.right = None  
+def inOrder(ids):
+    # In-order sequence of heap-numbered nodes (root 1, children 2k and 2k+1) without building the tree.
+    # Node k at depth d sits at index i = k - 2**d of its level; in a complete tree of height h
+    # its in-order rank grows with (2*i + 1) << (h - d), so only the given ids are ever touched.
+    ids = set(ids)
+    height = max(ids).bit_length() - 1
 
-class newTree:
-    def __init__(self, arr, insertType):
-        self.root = None
-        self.serialBuffer = []
-        if insertType == "levelorder":
-            self.insertLevelOrder(arr, 0, len(arr))
-        
-    def insertLevelOrder(self, arr, start, end): 
-        if start < end:
-            temp = newNode(arr[start])
-            if self.root == None:
-                self.root = temp
-            temp.left = self.insertLevelOrder(arr, 2 * start + 1, end)  
-            temp.right = self.insertLevelOrder(arr, 2 * start + 2, end)
-            return temp
-        else:
-            return None
-        
-    def serializeInOrder(self, root):
-        if root != None:
-            self.serializeInOrder(root.left)
-            self.serialBuffer.append(root.data)
-            self.serializeInOrder(root.right)
-        return self.serialBuffer
-    
-    def printInOrder(self, root):
-        if root != None:
-            self.printInOrder(root.left)
-            print(root.data)
-            self.printInOrder(root.right)
+    def rank(k):
+        depth = k.bit_length() - 1
+        return (2 * (k - (1 << depth)) + 1) << (height - depth)
 
-if __name__ == '__main__':
-    tree = newTree([0,1,2,3],"levelorder")
+    return sorted(ids, key=rank)
@@ -1,14 +1,38 @@
 import ast
-import astor
-from pyflowchart import Flowchart
+import os
+from collections import deque
+from cache import LRUCache, content_key
+from source_index import SourceIndex
+from code_metrics import compute_metrics
+from sandbox import run_job
+from layout import apply_layout
+from instrumentation import span
+from store import result_store
+
+# Cache of final flowchart payloads, keyed on the dedented source and field name
+flowchart_cache = LRUCache(
+    maxsize=int(os.environ.get("FLOWCHART_CACHE_SIZE", 512)),
+    ttl=float(os.environ.get("FLOWCHART_CACHE_TTL", 3600)),
+    store=result_store,
+    namespace="flowchart",
+)
+
+# Cache of detect_functions_from_code results, keyed on the source
+functions_cache = LRUCache(
+    maxsize=int(os.environ.get("FUNCTIONS_CACHE_SIZE", 512)),
+    ttl=float(os.environ.get("FUNCTIONS_CACHE_TTL", 3600)),
+    store=result_store,
+    namespace="functions",
+)
 
 # major seperation: code Imagination things
-def generate_flowchart_from_code(code, language):
+def generate_flowchart_from_code(code, language, tree=None, layout="grid"):
     nodes = []
     edges = []
     node_id = 1
     parent_map = {}
-    position_map = {}  # Map to track positions used by nodes
+    function_nodes = {}  # Function name -> id of its "Function:" node
+    occupied = set()  # Occupancy index of the (x, y) slots used by nodes
 
     # Fixed start node
     start_node = {
@@ -31,7 +55,7 @@ def generate_flowchart_from_code(code, language):
         y = current_position["y"] + y_offset
 
         # Check for overlap and adjust
-        while (x, y) in position_map.values():
+        while (x, y) in occupied:
             y += position_offset["y"]
 
         return {"x": x, "y": y}
@@ -52,7 +76,7 @@ def generate_flowchart_from_code(code, language):
         nodes.append(node)
         
         # Track the position
-        position_map[node_id] = (position["x"], position["y"])
+        occupied.add((position["x"], position["y"]))
 
         if parent_id is not None:
             edges.append({"id": f"e{parent_id}-{node_id}", "source": str(parent_id), "target": str(node_id)})
@@ -62,11 +86,12 @@ def generate_flowchart_from_code(code, language):
 
     def traverse(node, parent_id=None, depth=0):
         current_id = None
-        branch_nodes = []
+        branch_nodes = deque()
 
         if isinstance(node, ast.FunctionDef):
             current_id = add_node(f"Function: {node.name}", parent_id, depth)
             parent_map[node] = current_id
+            function_nodes[node.name] = current_id
         elif isinstance(node, ast.If):
             current_id = add_node(f"If condition at line {node.lineno}", parent_id, depth)
             parent_map[node] = current_id
@@ -91,7 +116,7 @@ def generate_flowchart_from_code(code, language):
 
         for child in ast.iter_child_nodes(node):
             if branch_nodes:
-                traverse(child, branch_nodes.pop(0), depth + 1)
+                traverse(child, branch_nodes.popleft(), depth + 1)
             else:
                 traverse(child, current_id, depth)
 
@@ -99,7 +124,7 @@ def generate_flowchart_from_code(code, language):
         """
         Handles the `if` and `else` branches, ensuring each branch is represented in the flowchart.
         """
-        branch_nodes = []
+        branch_nodes = deque()
         if_node_id = parent_map[if_node]
 
         # Process 'if' body
@@ -115,13 +140,21 @@ def generate_flowchart_from_code(code, language):
 
         return branch_nodes
 
-    def handle_function_calls(tree):
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Call):
-                func_name = get_func_name(node)
-                if func_name and func_name in parent_map:
-                    current_id = add_node(f"Function call: {func_name} at line {node.lineno}", parent_map[node], depth_map[parent_map[node]] + 1) # type: ignore
-                    parent_map[node] = current_id
+    def handle_function_calls():
+        """
+        Link every statement node containing calls to the "Function:" nodes of the called functions.
+        """
+        linked = set()
+        for stmt, stmt_id in parent_map.items():
+            if not isinstance(stmt, (ast.Expr, ast.Assign, ast.Return)):
+                continue
+            for node in ast.walk(stmt):
+                if isinstance(node, ast.Call):
+                    func_name = get_func_name(node)
+                    target_id = function_nodes.get(func_name)
+                    if target_id is not None and (stmt_id, target_id) not in linked:
+                        linked.add((stmt_id, target_id))
+                        edges.append({"id": f"c{stmt_id}-{target_id}", "source": str(stmt_id), "target": str(target_id), "label": "call"})
 
     def get_func_name(node):
         if isinstance(node.func, ast.Name):
@@ -130,13 +163,15 @@ def generate_flowchart_from_code(code, language):
             return node.func.attr
         return None
 
-    if language == 'python':
-        tree = ast.parse(code)
-    else:
+    if language != 'python':
         raise ValueError(f"Language '{language}' is not supported yet.")
+    if tree is None:
+        with span("parse"):
+            tree = ast.parse(code)
 
-    traverse(tree)
-    handle_function_calls(tree)
+    with span("graph"):
+        traverse(tree)
+        handle_function_calls()
 
     # Add the end node with fixed position
     end_node_id = node_id + 1
@@ -151,19 +186,23 @@ def generate_flowchart_from_code(code, language):
     if len(nodes) > 1:
         edges.append({"id": "e1-2", "source": "1", "target": nodes[1]["id"], "label": "start"})
 
-    # Connect all non-connected nodes to the end node
-    connected_nodes = {edge["source"] for edge in edges}
+    # Connect all non-connected nodes to the end node (call edges do not continue the flow)
+    connected_nodes = {edge["source"] for edge in edges if edge.get("label") != "call"}
     for node in nodes:
         if node["id"] not in connected_nodes and node["id"] != str(end_node_id):
             edges.append({"id": f"e{node['id']}-{end_node_id}", "source": node["id"], "target": str(end_node_id), "label": "end"})
 
-    pretty_code = astor.to_source(tree)
+    # astor and pyflowchart are imported on first use (see warmup.py)
+    import astor
+    with span("astor"):
+        pretty_code = astor.to_source(tree)
 
-    return {
-        "nodes": nodes,
-        "edges": edges,
-        "pretty_code": pretty_code
-    }
+    with span("layout"):
+        return apply_layout({
+            "nodes": nodes,
+            "edges": edges,
+            "pretty_code": pretty_code
+        }, layout)
 
 
 def remove_unexpected_indent(code):
@@ -179,43 +218,160 @@ def remove_unexpected_indent(code):
     # Join the lines back into a single string
     return '\n'.join(adjusted_lines)
 
-def flowchart_from_code(code):
+def find_flowchart_field(tree, field):
+    """
+    Locate the pyflowchart field path (e.g. "Bar.buzz") in a parsed module.
+    Unlike Flowchart.find_field_from_ast this never mutates the tree, so it is safe on shared ASTs.
+
+    Returns:
+    - ast.AST or None: The matching node, the module itself for "", or None when not found.
+    """
+    if field == "":
+        return tree
+
+    node = tree
+    for name in field.split('.'):
+        match = None
+        for child in getattr(node, 'body', []):
+            if getattr(child, 'name', None) == name:
+                match = child
+        if match is None:
+            return None
+        node = match
+    return node
+
+def flowchart_from_tree(tree, field):
+    """
+    Build a pyflowchart Flowchart for field from an already parsed module.
+    Mirrors Flowchart.from_code(code, field=field, inner=False) without re-parsing the source.
+    """
+    from pyflowchart import Flowchart
+    from pyflowchart.ast_node import parse as parse_flowchart_ast
+
+    field_ast = find_flowchart_field(tree, field)
+    if field_ast is None or not getattr(field_ast, 'body', None):
+        raise ValueError(f"{field!r}: nothing to parse. Check that the field path points to a valid function or class.")
+    return Flowchart(parse_flowchart_ast([field_ast], simplify=True, conds_align=False).head)
+
+def cached_flowchart(code, field, tree=None, gate=None):
+    """
+    Build the pyflowchart payload for field in code, reusing a cached result when
+    the same dedented source and field were seen before.
+    An already parsed tree of code can be passed to skip pyflowchart's own parse.
+    With a gate (serving.EndpointGate), only a cache miss waits for a slot, so cached
+    results are served even when the endpoint is saturated.
+    """
+    key = content_key("flowchart", code, field)
+
+    def compute():
+        if tree is not None:
+            with span("pyflowchart"):
+                return {
+                    "flowchart": flowchart_from_tree(tree, field).flowchart(),
+                }
+        # Untrusted source goes through pyflowchart in a sandboxed worker
+        if gate is None:
+            return run_job(build_flowchart, code, field)
+        with gate:
+            return run_job(build_flowchart, code, field)
+
+    return flowchart_cache.get_or_compute(key, compute)
+
+def build_flowchart(code, field):
+    """
+    Parse code with pyflowchart and return the flowchart payload for field.
+    """
+    from pyflowchart import Flowchart
+
+    with span("pyflowchart"):
+        fc = Flowchart.from_code(code, field=field, inner=False)
+        return {
+            "flowchart": fc.flowchart(),
+        }
+
+def flowchart_from_code(code, gate=None):
     # Remove unexpected indentations from start
     code = remove_unexpected_indent(code)
+    return cached_flowchart(code, 'example', gate=gate)
 
-    fc = Flowchart.from_code(code, field='example', inner=False)
-    return {
-        "flowchart": fc.flowchart(),
-    }
+def flowchart_from_snippet(code,function_name, gate=None):
+    code = remove_unexpected_indent(code)
+    return cached_flowchart(code, function_name, gate=gate)
+
+# Sections served by analyze_bundle, in the order they are computed
+BUNDLE_SECTIONS = ("functions", "flowchart", "graph", "metrics")
+
+def analyze_bundle(code, function_name='', sections=None):
+    """
+    Run several analyses over one shared parse of the provided code.
+
+    Args:
+    - code (str): The source code to analyze.
+    - function_name (str): pyflowchart field for the flowchart section ("" for the whole module).
+    - sections (iterable, optional): Subset of BUNDLE_SECTIONS to compute. Defaults to all.
 
-def flowchart_from_snippet(code,function_name):
+    Returns:
+    - dict: One key per requested section, plus "errors" mapping section names to failure messages.
+    """
+    sections = BUNDLE_SECTIONS if sections is None else sections
     code = remove_unexpected_indent(code)
-    fc = Flowchart.from_code(code, field=function_name, inner=False)
-    return {
-        "flowchart": fc.flowchart(),
-    }
+    result = {"errors": {}}
+
+    try:
+        with span("parse"):
+            tree = ast.parse(code)
+    except SyntaxError as se:
+        tree = None
+        parse_error = f"SyntaxError: {str(se)} at line {se.lineno}"
+
+    for section in sections:
+        try:
+            if section == "functions":
+                # detect_functions_from_code recovers from syntax errors on its own
+                result["functions"] = detect_functions_from_code(code, tree)
+            elif tree is None:
+                result["errors"][section] = parse_error
+            elif section == "flowchart":
+                result["flowchart"] = cached_flowchart(code, function_name, tree)["flowchart"]
+            elif section == "graph":
+                result["graph"] = generate_flowchart_from_code(code, 'python', tree)
+            elif section == "metrics":
+                result["metrics"] = compute_metrics(code, tree)
+        except Exception as e:
+            result["errors"][section] = str(e)
+
+    return result
+
+def cached_functions(code):
+    """
+    detect_functions_from_code(code), reusing the result of an earlier request with the same source.
+    """
+    return functions_cache.get_or_compute(content_key("functions", code), lambda: detect_functions_from_code(code))
 
 # major seperation: code validation and seperation things
-def extract_function_code(code, func_node):
+def extract_function_code(code, func_node, index=None):
     """
     Extract the source code for a given function node from the original code.
     Args:
     - code (str): The full source code.
     - func_node (ast.FunctionDef): The AST node corresponding to the function.
+    - index (SourceIndex, optional): Prebuilt line index of code, reused across calls.
     Returns:
     - str: The extracted source code for the function.
     """
-    start_line = func_node.lineno - 1
-    end_line = func_node.end_lineno
-    func_code_lines = code.splitlines()[start_line:end_line]
-    return "\n".join(func_code_lines)
+    if index is None:
+        index = SourceIndex(code)
+    return index.node_lines(func_node)
 
-def detect_functions_from_code(code):
+def detect_functions_from_code(code, tree=None, index=None):
     """
     Detect and extract functions and imports in the provided code, filtering invalid content.
+    Code that does not parse is handed to detect_functions_tolerant.
     
     Args:
     - code (str): The source code to analyze.
+    - tree (ast.Module, optional): Already parsed tree of code, reused instead of parsing again.
+    - index (SourceIndex, optional): Prebuilt line index of code, reused instead of building one.
     
     Returns:
     - dict: Contains function names as keys and the function code, along with errors found.
@@ -224,34 +380,19 @@ def detect_functions_from_code(code):
     imports = []
     errors = []
 
-    try:
-        tree = ast.parse(code)
+    if index is None:
+        index = SourceIndex(code)
 
-        # Track class methods to avoid duplicates
-        class_methods = set()
+    try:
+        if tree is None:
+            with span("parse"):
+                tree = ast.parse(code)
 
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                # Skip if the function is already listed as a class method
-                if node.name in class_methods:
-                    continue
-                func_code = extract_function_code(code, node)
-                functions[node.name] = func_code
-            elif isinstance(node, ast.Import) or isinstance(node, ast.ImportFrom):
-                import_stmt = extract_import_code(code, node)
-                imports.append(import_stmt)
-            elif isinstance(node, ast.ClassDef):
-                methods = detect_class_methods(code, node)
-                functions.update(methods)
-                class_methods.update([method.split(".")[1] for method in methods])
+        collect_definitions(code, tree, index, functions, imports)
 
-    except SyntaxError as se:
-        errors.append(f"SyntaxError: {str(se)} at line {se.lineno}")
-        return filter_and_retry(code, se.lineno, functions, imports, errors)
-
-    except IndentationError as ie:
-        errors.append(f"IndentationError: {str(ie)} at line {ie.lineno}")
-        return filter_and_retry(code, ie.lineno, functions, imports, errors)
+    except SyntaxError:
+        # IndentationError is a SyntaxError too; recover block by block
+        return detect_functions_tolerant(code, index)
 
     except Exception as e:
         errors.append(f"Unknown error: {str(e)}")
@@ -259,40 +400,144 @@ def detect_functions_from_code(code):
 
     return {"functions": functions, "imports": imports, "errors": errors}
 
-def extract_import_code(code, node):
+def collect_definitions(code, tree, index, functions, imports, class_methods=None):
+    """
+    Walk a parsed tree and record its functions, class methods and imports.
+    
+    Args:
+    - code (str): The full source code the tree line numbers refer to.
+    - tree (ast.AST): Parsed module or block.
+    - index (SourceIndex): Line index of code.
+    - functions (dict): Updated in place with name -> source.
+    - imports (list): Extended in place with import statements.
+    - class_methods (set, optional): Method names already seen, shared when merging several blocks.
+    """
+    # Track class methods to avoid duplicates
+    if class_methods is None:
+        class_methods = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            # Skip if the function is already listed as a class method
+            if node.name in class_methods:
+                continue
+            func_code = extract_function_code(code, node, index)
+            functions[node.name] = func_code
+        elif isinstance(node, ast.Import) or isinstance(node, ast.ImportFrom):
+            import_stmt = extract_import_code(code, node, index)
+            imports.append(import_stmt)
+        elif isinstance(node, ast.ClassDef):
+            methods = detect_class_methods(code, node, index)
+            functions.update(methods)
+            class_methods.update([method.split(".")[1] for method in methods])
+
+# Parse attempts per broken block before the whole block is discarded
+MAX_BLOCK_RETRIES = 10
+
+def detect_functions_tolerant(code, index=None):
+    """
+    Error-tolerant variant of detect_functions_from_code.
+    
+    The source is split into top-level statement blocks which are parsed independently,
+    so only broken blocks are retried (one offending line blanked per attempt) or discarded.
+    Results from all blocks are merged in a single pass over the file.
+    
+    Args:
+    - code (str): The source code to analyze.
+    - index (SourceIndex, optional): Prebuilt line index of code.
+    
+    Returns:
+    - dict: Same shape as detect_functions_from_code.
+    """
+    if index is None:
+        index = SourceIndex(code)
+
+    functions = {}
+    imports = []
+    errors = []
+    class_methods = set()
+
+    for start, end in index.top_level_blocks():
+        tree = parse_block(index, start, end, errors)
+        if tree is not None:
+            collect_definitions(code, tree, index, functions, imports, class_methods)
+
+    return {"functions": functions, "imports": imports, "errors": errors}
+
+def parse_block(index, start, end, errors):
+    """
+    Parse lines start..end of the indexed source on their own, blanking offending lines on failure.
+    
+    Returns:
+    - ast.Module or None: The block tree with line numbers relative to the whole file,
+      or None when the block had to be discarded.
+    """
+    lines = index.lines[start - 1:end]
+
+    for _ in range(MAX_BLOCK_RETRIES):
+        try:
+            tree = ast.parse("\n".join(lines))
+        except SyntaxError as se:
+            error_line = start - 1 + se.lineno if se.lineno else None
+            errors.append(f"{type(se).__name__}: {se.msg} at line {error_line}")
+
+            if not se.lineno or not 1 <= se.lineno <= len(lines) or not lines[se.lineno - 1].strip():
+                break
+            errors.append(f"Filtered out problematic content at line {error_line}: {lines[se.lineno - 1]}")
+            lines[se.lineno - 1] = ''
+            continue
+        except ValueError as ve:
+            errors.append(f"Unknown error: {str(ve)}")
+            break
+
+        ast.increment_lineno(tree, start - 1)
+        return tree
+
+    errors.append(f"Discarded lines {start}-{end}")
+    return None
+
+def extract_import_code(code, node, index=None):
     """
     Extract the source code for import statements.
+    Multi-line imports are returned whole, and only the statement itself when
+    several share a line.
     """
-    start_line = node.lineno - 1
-    return code.splitlines()[start_line]
+    if index is None:
+        index = SourceIndex(code)
+    return index.segment(node)
 
-def detect_class_methods(code, class_node):
+def detect_class_methods(code, class_node, index=None):
     """
     Detect methods inside a class definition.
     """
+    if index is None:
+        index = SourceIndex(code)
     methods = {}
     for node in class_node.body:
         if isinstance(node, ast.FunctionDef):
             method_name = f"{class_node.name}.{node.name}"
-            method_code = extract_function_code(code, node)
+            method_code = extract_function_code(code, node, index)
             methods[method_name] = method_code
     return methods
 
-def filter_and_retry(code, error_line, functions, imports, errors):
+def filter_and_retry(code, error_line, functions, imports, errors, index=None):
     """
     Filter invalid content based on error line and retry parsing.
+    The retry runs detect_functions_tolerant once instead of re-parsing the whole file per error.
     """
-    lines = code.splitlines()
+    if index is None:
+        index = SourceIndex(code)
+    lines = list(index.lines)
     if error_line and 0 <= error_line - 1 < len(lines):
         errors.append(f"Filtered out problematic content at line {error_line}: {lines[error_line - 1]}")
         lines[error_line - 1] = ''
     
     filtered_code = "\n".join(lines)
     try:
-        new_result = detect_functions_from_code(filtered_code)
+        new_result = detect_functions_tolerant(filtered_code)
         new_result["functions"].update(functions)
         new_result["imports"].extend(imports)
-        new_result["errors"].extend(errors)
+        new_result["errors"] = errors + new_result["errors"]
         return new_result
     
     except Exception as e:
@@ -0,0 +1,52 @@
+import importlib
+import os
+import time
+
+# Heavy backends the service imports on first use instead of at start-up
+LAZY_BACKENDS = (
+    "astor",
+    "pyflowchart",
+    "pyflowchart.ast_node",
+    "code_analyzer",  # pulls in pandas
+    "rich.console",
+    "Converter",  # PIL and the pseudocode drawer
+)
+
+# PRELOAD_BACKENDS=1 imports them before serving, so forked sandbox workers inherit them
+PRELOAD_BACKENDS = os.environ.get("PRELOAD_BACKENDS", "0").lower() in ("1", "true", "yes")
+
+def warm_up(modules=LAZY_BACKENDS):
+    """
+    Import the lazily loaded backends now. Call it in a parent process before it forks
+    (e.g. a gunicorn --preload hook, or before the first sandbox job) so every worker starts warm.
+    Packages that are not installed are reported and skipped.
+
+    Args:
+    - modules (iterable): Module names to import.
+
+    Returns:
+    - dict: Module name -> seconds spent importing it, or None when it could not be imported.
+    """
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Could not preload {name}: {str(e)}")
+            timings[name] = None
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def preload_if_configured():
+    """
+    Run warm_up when PRELOAD_BACKENDS is set and log how long it took.
+    """
+    if not PRELOAD_BACKENDS:
+        return None
+    start = time.perf_counter()
+    timings = warm_up()
+    loaded = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items() if seconds is not None)
+    print(f"Preloaded backends in {time.perf_counter() - start:.3f}s ({loaded})")
+    return timings
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Run jobs inline and keep the shared result store out of the tests
+os.environ.setdefault("SANDBOX_WORKERS", "0")
+os.environ.setdefault("RESULT_STORE_PATH", "")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
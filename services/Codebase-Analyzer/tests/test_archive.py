@@ -0,0 +1,118 @@
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+import archive
+from archive import ArchiveError, UnsupportedArchive, open_archive, stream_archive_results
+
+FILES = {
+    "pkg/a.py": "def a(x):\n    if x:\n        return 1\n    return 0\n",
+    "pkg/b.py": "class B:\n    def m(self):\n        return 2\n",
+    "README.md": "not python",
+}
+
+class OneWayStream(io.RawIOBase):
+    """
+    Request-body-like stream that cannot seek.
+    """
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+def make_zip(files=FILES):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, text in files.items():
+            zf.writestr(name, text)
+    return buffer.getvalue()
+
+def make_tar(files=FILES, mode="w:gz"):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tf:
+        for name, text in files.items():
+            data = text.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("data", [make_zip(), make_tar(), make_tar(mode="w"), make_tar(mode="w:bz2")])
+@pytest.mark.parametrize("seekable", [True, False])
+def test_python_files_are_read(data, seekable):
+    stream = io.BytesIO(data) if seekable else OneWayStream(data)
+    sources = list(open_archive(stream))
+    assert sorted(path for path, _, _ in sources) == ["pkg/a.py", "pkg/b.py"]
+    assert dict((path, code) for path, code, _ in sources) == {k: v for k, v in FILES.items() if k.endswith(".py")}
+
+def test_unreadable_uploads_are_rejected_before_reading_members():
+    with pytest.raises(ArchiveError):
+        open_archive(io.BytesIO(b""))
+    with pytest.raises(UnsupportedArchive):
+        open_archive(OneWayStream(b"just some text" * 40))
+    with pytest.raises(ArchiveError):
+        open_archive(io.BytesIO(b"PK\x03\x04" + b"\0" * 300))
+    with pytest.raises(ArchiveError):
+        open_archive(OneWayStream(b"\x1f\x8b" + b"\0" * 300))
+
+def test_member_limits(monkeypatch):
+    monkeypatch.setattr(archive, "MAX_ARCHIVE_MEMBER_BYTES", 20)
+    sources = dict((path, error) for path, _, error in open_archive(io.BytesIO(make_zip())))
+    assert sources["pkg/a.py"] == "File exceeds 20 bytes"
+
+    monkeypatch.setattr(archive, "MAX_ARCHIVE_MEMBER_BYTES", 1024)
+    monkeypatch.setattr(archive, "MAX_ARCHIVE_MEMBERS", 1)
+    errors = [error for _, _, error in open_archive(io.BytesIO(make_tar()))]
+    assert errors[-1] == "Archive has more than 1 Python files"
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_WORKERS", 2)
+
+def lines_of(chunks):
+    return [json.loads(chunk) for chunk in chunks]
+
+def test_results_stream_one_line_per_file(small_pool):
+    sources = [
+        ("a.py", FILES["pkg/a.py"], None),
+        ("bad.py", None, "File is not valid UTF-8"),
+        ("empty.py", "   ", None),
+    ]
+    lines = lines_of(stream_archive_results(sources, ["functions"]))
+    by_path = {line["path"]: line for line in lines[:-1]}
+    assert by_path["a.py"]["functions"]["functions"] == {"a": FILES["pkg/a.py"].rstrip("\n")}
+    assert by_path["bad.py"]["errors"] == {"file": "File is not valid UTF-8"}
+    assert by_path["empty.py"]["errors"] == {"file": "Empty file"}
+    assert lines[-1] == {"summary": {"files": 3, "failed": 1}}
+
+def test_archive_broken_mid_stream_ends_with_an_error_line(small_pool):
+    def sources():
+        yield "a.py", FILES["pkg/a.py"], None
+        raise ArchiveError("Could not read the tar archive: unexpected end of data")
+
+    lines = lines_of(stream_archive_results(sources(), ["functions"]))
+    assert lines[0]["path"] == "a.py"
+    assert lines[-1] == {"error": "Could not read the tar archive: unexpected end of data",
+                         "summary": {"files": 1, "failed": 0}}
+
+def test_endpoint_status_codes():
+    import app
+
+    client = app.app.test_client()
+    assert client.post("/analyze-archive", data=b"plain text" * 40).status_code == 415
+    assert client.post("/analyze-archive", data=b"PK\x03\x04" + b"\0" * 300).status_code == 400
+
+    response = client.post("/analyze-archive?sections=functions",
+                           data={"file": (io.BytesIO(make_zip()), "repo.zip")}, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = lines_of(response.get_data(as_text=True).splitlines())
+    assert lines[-1] == {"summary": {"files": 2, "failed": 0}}
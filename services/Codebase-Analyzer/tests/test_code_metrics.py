@@ -0,0 +1,44 @@
+import pytest
+
+from code_metrics import compute_metrics
+
+@pytest.mark.parametrize("code", ["x = 1\n", "x = 1"])
+def test_trailing_newline_is_not_a_line(code):
+    result = compute_metrics(code)
+    assert result["num_lines"] == 1
+    assert result["loc"] == 1
+    assert result["blank_lines"] == 0
+    assert result["sloc"] == 1
+
+def test_line_classification():
+    code = "# header\n\ndef f(a):\n    # note\n    return a  # trailing\n"
+    result = compute_metrics(code)
+    assert result["num_lines"] == 5
+    assert result["blank_lines"] == 1
+    assert result["comment_lines"] == 2
+    assert result["sloc"] == 2
+
+    function = result["functions"][0]
+    assert (function["name"], function["lineno"], function["end_lineno"]) == ("f", 3, 5)
+    assert function["loc"] == 3
+    assert function["comment_lines"] == 1
+
+def test_complexity_and_nesting():
+    code = (
+        "def f(a, b):\n"
+        "    if a and b:\n"
+        "        for i in range(a):\n"
+        "            if i:\n"
+        "                return i\n"
+        "    elif b:\n"
+        "        return b\n"
+        "    return 0\n"
+    )
+    function = compute_metrics(code)["functions"][0]
+    # 1 + if + and + for + if + elif
+    assert function["complexity"] == 6
+    assert function["max_nesting"] == 3
+
+def test_syntax_error_is_raised():
+    with pytest.raises(SyntaxError):
+        compute_metrics("def f(:\n")
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+import graph_format
+from graph_format import FormatNotAcceptable, encode_compact_graph, negotiate_graph_format, to_compact
+
+GRAPH = {
+    "nodes": [
+        {"id": "1", "label": "Start", "position": {"x": 0, "y": 0}},
+        {"id": "2", "label": "If a", "position": {"x": 0, "y": 70}},
+        {"id": "3", "label": "End", "position": {"x": 150, "y": 140}},
+    ],
+    "edges": [
+        {"id": "e1-2", "source": "1", "target": "2"},
+        {"id": "e2-3", "source": "2", "target": "3", "label": "end"},
+    ],
+    "pretty_code": "if a:\n    pass\n",
+}
+
+def test_to_compact():
+    assert to_compact(GRAPH) == {
+        "version": 2,
+        "nodes": {"label": ["Start", "If a", "End"], "x": [0, 0, 150], "y": [0, 70, 140]},
+        "edges": {"source": [0, 1], "target": [1, 2], "label": {"1": "end"}},
+        "pretty_code": "if a:\n    pass\n",
+    }
+
+def test_explicit_ids_are_kept():
+    graph = dict(GRAPH, nodes=[dict(node, id=f"n{node['id']}") for node in GRAPH["nodes"]],
+                 edges=[dict(edge, source=f"n{edge['source']}", target=f"n{edge['target']}") for edge in GRAPH["edges"]])
+    compact = to_compact(graph)
+    assert compact["nodes"]["id"] == ["n1", "n2", "n3"]
+    assert compact["edges"]["source"] == [0, 1]
+
+def test_compact_is_minified_json():
+    body, mimetype = encode_compact_graph(GRAPH, "compact")
+    assert mimetype == graph_format.COMPACT_MIMETYPE
+    assert body == json.dumps(to_compact(GRAPH), separators=(",", ":"))
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    body, mimetype = encode_compact_graph(GRAPH, "msgpack")
+    assert mimetype == graph_format.MSGPACK_MIMETYPE
+    assert msgpack.unpackb(body, raw=False, strict_map_key=False) == to_compact(GRAPH)
+
+@pytest.mark.parametrize("requested, accept, expected", [
+    ("", [], "json"),
+    ("", [("text/html", 1)], "json"),
+    ("", [(graph_format.COMPACT_MIMETYPE, 1), ("application/json", 0.5)], "compact"),
+    ("", [("application/x-msgpack", 1)], "msgpack"),
+    ("compact", [("application/json", 1)], "compact"),
+])
+def test_negotiation(requested, accept, expected, monkeypatch):
+    monkeypatch.setattr(graph_format, "msgpack", object())
+    assert negotiate_graph_format(requested, MIMEAccept(accept)) == expected
+
+def test_unknown_or_unavailable_format(monkeypatch):
+    with pytest.raises(FormatNotAcceptable):
+        negotiate_graph_format("xml", MIMEAccept([]))
+    monkeypatch.setattr(graph_format, "msgpack", None)
+    with pytest.raises(FormatNotAcceptable):
+        negotiate_graph_format("msgpack", MIMEAccept([]))
@@ -0,0 +1,60 @@
+import gzip
+import io
+import json
+
+import pytest
+from werkzeug.test import Client
+from werkzeug.wrappers import Request, Response
+
+from payloads import LimitedBody, PayloadError, PayloadTooLarge, RequestBodyLimit
+
+def test_limited_body_reads_plain_and_gzip():
+    data = b"x" * 1000
+    assert LimitedBody(io.BytesIO(data), 1000, length=len(data)).read() == data
+    assert LimitedBody(io.BytesIO(gzip.compress(data)), 1000, gzipped=True).read() == data
+
+def test_limited_body_stops_a_gzip_bomb():
+    bomb = gzip.compress(b"\0" * (10 * 1024 * 1024))
+    body = LimitedBody(io.BytesIO(bomb), 64 * 1024, gzipped=True)
+    with pytest.raises(PayloadTooLarge):
+        body.read()
+
+def test_limited_body_rejects_corrupt_gzip():
+    with pytest.raises(PayloadError):
+        LimitedBody(io.BytesIO(b"\x1f\x8bnot gzip"), 1000, gzipped=True).read()
+    with pytest.raises(PayloadError):
+        LimitedBody(io.BytesIO(gzip.compress(b"abc" * 100)[:-10]), 1000, gzipped=True).read()
+
+def test_limited_body_readline():
+    body = LimitedBody(io.BytesIO(b"a\nbc\n"), 100)
+    assert list(body) == [b"a\n", b"bc\n"]
+
+def echo_app(environ, start_response):
+    request = Request(environ)
+    stream = request.stream
+    response = Response(json.dumps({"size": len(stream.read()), "streamed": isinstance(stream, LimitedBody)}))
+    return response(environ, start_response)
+
+@pytest.fixture
+def client():
+    return Client(RequestBodyLimit(echo_app, max_body=1000, streaming_routes={"/stream": 5000}))
+
+def test_declared_length_over_limit_is_rejected(client):
+    response = client.post("/", data=b"x" * 1001)
+    assert response.status_code == 413
+
+def test_gzip_body_is_decoded_and_limited(client):
+    response = client.post("/", data=gzip.compress(b"x" * 900), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert json.loads(response.get_data())["size"] == 900
+
+    response = client.post("/", data=gzip.compress(b"x" * 2000), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 413
+
+def test_unsupported_encoding(client):
+    assert client.post("/", data=b"x", headers={"Content-Encoding": "br"}).status_code == 415
+
+def test_streaming_routes_get_their_own_limit(client):
+    response = client.post("/stream", data=gzip.compress(b"x" * 4000), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert json.loads(response.get_data()) == {"size": 4000, "streamed": True}
@@ -0,0 +1,59 @@
+import os
+import time
+
+import pytest
+
+import sandbox
+from sandbox import JobMemoryExceeded, JobTimeout, SandboxPool, WorkerCrashed
+
+pytestmark = pytest.mark.skipif(sandbox.resource is None, reason="resource limits need a Unix platform")
+
+def sleep_for(seconds):
+    time.sleep(seconds)
+
+def allocate(size):
+    return len(bytearray(size))
+
+def crash():
+    os._exit(3)
+
+def fail():
+    raise ValueError("boom")
+
+def nested_pool():
+    return sandbox.get_sandbox() is None
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(size=1, timeout=1, memory_limit=256 * 1024 * 1024, queue_timeout=1)
+    yield pool
+    pool.close()
+
+def test_result_comes_from_a_worker(pool):
+    assert pool.run(os.getpid) != os.getpid()
+
+def test_exceptions_are_reraised(pool):
+    with pytest.raises(ValueError, match="boom"):
+        pool.run(fail)
+
+def test_timeout_replaces_the_worker(pool):
+    with pytest.raises(JobTimeout):
+        pool.run(sleep_for, 5)
+    assert pool.run(sum, [1, 2]) == 3
+
+def test_memory_limit(pool):
+    with pytest.raises(JobMemoryExceeded):
+        pool.run(allocate, 1024 * 1024 * 1024)
+    assert pool.run(allocate, 1024) == 1024
+
+def test_crash_replaces_the_worker(pool):
+    with pytest.raises(WorkerCrashed):
+        pool.run(crash)
+    assert pool.run(sum, [2, 3]) == 5
+
+def test_workers_run_nested_jobs_inline(pool):
+    assert pool.run(nested_pool) is True
+
+def test_run_job_inline_without_workers(monkeypatch):
+    monkeypatch.setattr(sandbox, "SANDBOX_WORKERS", 0)
+    assert sandbox.run_job(os.getpid) == os.getpid()
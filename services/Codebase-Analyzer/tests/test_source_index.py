@@ -0,0 +1,39 @@
+import ast
+
+from source_index import SourceIndex
+
+def test_lines_and_length():
+    index = SourceIndex("a = 1\r\nb = 2\rc = 3\n")
+    assert len(index) == 3
+    assert [index.line(n) for n in (1, 2, 3)] == ["a = 1", "b = 2", "c = 3"]
+    assert index.line_span(2, 3) == "b = 2\nc = 3"
+    assert len(SourceIndex("a = 1")) == 1
+
+def test_segment_matches_ast_positions():
+    code = "x = 1\nvalue = f'é' + call(a,\n    b)\n"
+    index = SourceIndex(code)
+    node = ast.parse(code).body[1].value.right
+    assert index.segment(node) == "call(a,\n    b)"
+    assert index.segment(node) == ast.get_source_segment(code, node)
+
+def test_top_level_blocks():
+    code = (
+        "import os\n"
+        "\n"
+        "@decorator\n"
+        "def f(\n"
+        "    a,\n"
+        "):\n"
+        "    return a\n"
+        "\n"
+        "try:\n"
+        "    pass\n"
+        "except ValueError:\n"
+        "    pass\n"
+    )
+    assert SourceIndex(code).top_level_blocks() == [(1, 2), (3, 8), (9, 12)]
+
+def test_broken_definition_does_not_swallow_the_rest():
+    code = "def f(:\n    pass\ndef g():\n    return 1\n"
+    blocks = SourceIndex(code).top_level_blocks()
+    assert blocks[-1][0] == 3
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import stat
+
+import pytest
+
+import store
+from cache import LRUCache
+from store import ResultStore
+
+@pytest.fixture
+def result_store(tmp_path):
+    return ResultStore(str(tmp_path / "cache" / "results.sqlite3"))
+
+def test_round_trip_through_json(result_store):
+    result_store.set("ns", "key", {"functions": {"f": "def f(): pass"}, "lines": [1, 2]})
+    assert result_store.get("ns", "key") == {"functions": {"f": "def f(): pass"}, "lines": [1, 2]}
+    assert result_store.get("other", "key") is None
+    assert result_store.stats()["hits"] == 1
+
+def test_files_are_private(result_store):
+    result_store.set("ns", "key", 1)
+    directory = os.path.dirname(result_store.path)
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(result_store.path).st_mode) == 0o600
+
+def test_writable_file_is_refused(tmp_path):
+    path = tmp_path / "results.sqlite3"
+    path.touch()
+    path.chmod(0o666)
+    refused = ResultStore(str(path))
+    refused.set("ns", "key", 1)
+    assert refused.get("ns", "key") is None
+    assert refused.stats()["errors"] == 2
+
+def test_entries_of_another_version_are_not_read(result_store, monkeypatch):
+    result_store.set("ns", "key", "old")
+    monkeypatch.setattr(store, "code_version", lambda: "other-build")
+    assert result_store.get("ns", "key") is None
+
+def test_expired_entries_are_misses(result_store):
+    result_store.set("ns", "key", "value")
+    assert result_store.get("ns", "key", ttl=-1) is None
+
+def test_eviction_keeps_the_store_under_its_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "EVICTION_CHECK_INTERVAL", 1)
+    small = ResultStore(str(tmp_path / "results.sqlite3"), max_bytes=10000)
+    for i in range(50):
+        small.set("ns", str(i), "x" * 1000)
+    stats = small.stats()
+    assert stats["bytes"] <= 10000
+    assert stats["evictions"] > 0
+    assert small.get("ns", "49") is not None
+
+def test_old_schema_is_replaced(tmp_path):
+    path = tmp_path / "results.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE results (namespace, key, value, size, created, accessed)")
+    conn.commit()
+    conn.close()
+    path.chmod(0o600)
+    upgraded = ResultStore(str(path))
+    upgraded.set("ns", "key", [1])
+    assert upgraded.get("ns", "key") == [1]
+
+def test_lru_cache_falls_back_to_the_store_with_codecs(result_store):
+    def make():
+        return LRUCache(maxsize=4, ttl=60, store=result_store, namespace="sets",
+                        encode=sorted, decode=set)
+
+    make().set("key", {3, 1, 2})
+    fresh = make()
+    assert fresh.get("key") == {1, 2, 3}
+    assert fresh.stats()["store_hits"] == 1